@@ -6,17 +6,32 @@
 """
 
 import os
-import glob
+import sys
 import threading
 from tkinter import *
 from tkinter import filedialog, ttk, messagebox
-from PIL import Image
+
+# 与命令行版本共用转换引擎
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_converter_core import (
+    ENCODE_PROFILES, DEFAULT_PROFILE, DEFAULT_WORKERS, SUPPORTED_FORMATS,
+    ConvertOptions, RunReport, get_image_files, convert_batch,
+)
+
+# 进度刷新间隔（毫秒），转换线程只更新计数，界面按固定频率读取
+PROGRESS_INTERVAL_MS = 100
+
+# 运行报告的文件名（位于输出目录，见 RunReport），完整的失败列表在其中
+REPORT_NAME = "convert_report.jsonl"
+
+# 结果对话框中显示的失败项数
+SHOWN_FAILURES = 5
 
 class ImageConverterGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("批量图片格式转换器GUI版本 -MVP")
-        self.root.geometry("500x600")
+        self.root.geometry("500x680")
         self.root.resizable(True, True)
         
         # 设置全局字体
@@ -27,11 +42,22 @@ class ImageConverterGUI:
         self.output_dir = StringVar(value="output")
         self.target_format = StringVar(value="jpg")
         self.quality = IntVar(value=85)
+        self.profile = StringVar(value=DEFAULT_PROFILE)
         self.recursive = BooleanVar(value=False)
+        self.workers = IntVar(value=DEFAULT_WORKERS)
         self.converting = False
         self.total_files = 0
         self.processed_files = 0
         
+        # 转换线程与界面共享的进度，由锁保护
+        self.progress_lock = threading.Lock()
+        self.success_count = 0
+        self.fail_count = 0
+        self.report = None
+        self.scan_done = False
+        self.batch_done = False
+        self.cancel_event = threading.Event()
+        
         # 创建主框架
         main_frame = Frame(self.root, padx=20, pady=20)
         main_frame.pack(fill=BOTH, expand=True)
@@ -62,7 +88,7 @@ class ImageConverterGUI:
         
         Label(format_frame, text="目标格式：").pack(side=LEFT)
         
-        supported_formats = ["jpg", "jpeg", "png", "bmp", "gif", "tiff", "tif", "webp", "ico"]
+        supported_formats = SUPPORTED_FORMATS
         format_menu = ttk.Combobox(format_frame, textvariable=self.target_format, values=supported_formats, state="readonly", width=10)
         format_menu.pack(side=LEFT, padx=5)
         format_menu.current(0)
@@ -79,12 +105,30 @@ class ImageConverterGUI:
         self.quality_label = Label(quality_frame, text=f"{self.quality.get()}", width=4)
         self.quality_label.pack(side=LEFT, padx=5)
         
+        # 编码配置
+        profile_frame = Frame(main_frame)
+        profile_frame.pack(fill=X, pady=5)
+        
+        Label(profile_frame, text="编码配置：").pack(side=LEFT)
+        
+        profile_menu = ttk.Combobox(profile_frame, textvariable=self.profile, values=list(ENCODE_PROFILES), state="readonly", width=10)
+        profile_menu.pack(side=LEFT, padx=5)
+        
+        Label(profile_frame, text="fast速度优先 / balanced均衡 / smallest体积最小").pack(side=LEFT, padx=5)
+        
         # 递归选项
         recursive_frame = Frame(main_frame)
         recursive_frame.pack(fill=X, pady=5)
         
         Checkbutton(recursive_frame, text="递归处理子目录", variable=self.recursive).pack(side=LEFT)
         
+        # 并行进程数
+        workers_frame = Frame(main_frame)
+        workers_frame.pack(fill=X, pady=5)
+        
+        Label(workers_frame, text="并行进程：").pack(side=LEFT)
+        Spinbox(workers_frame, from_=1, to=max(64, DEFAULT_WORKERS), textvariable=self.workers, width=5).pack(side=LEFT, padx=5)
+        
         # 进度条
         self.progress_frame = Frame(main_frame)
         self.progress_frame.pack(fill=X, pady=15)
@@ -134,71 +178,6 @@ class ImageConverterGUI:
         if dir_path:
             self.output_dir.set(dir_path)
     
-    def get_image_files(self, input_dir, recursive=False):
-        """获取目录下所有图片文件"""
-        # 支持的图片扩展名
-        image_extensions = [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif", ".webp", ".ico"]
-        
-        image_files = []
-        
-        if recursive:
-            # 递归获取所有图片文件
-            for root, _, files in os.walk(input_dir):
-                for file in files:
-                    if os.path.splitext(file)[1].lower() in image_extensions:
-                        image_files.append(os.path.join(root, file))
-        else:
-            # 获取当前目录下所有图片文件
-            for ext in image_extensions:
-                image_files.extend(glob.glob(os.path.join(input_dir, f"*{ext}"), recursive=False))
-        
-        return image_files
-    
-    def convert_image(self, img_path, output_dir, target_format, quality=85):
-        """转换单张图片的格式"""
-        try:
-            # 打开图片
-            with Image.open(img_path) as img:
-                # 确保输出目录存在
-                os.makedirs(output_dir, exist_ok=True)
-                
-                # 获取文件名（不含扩展名）
-                filename = os.path.splitext(os.path.basename(img_path))[0]
-                # 设置输出路径
-                output_path = os.path.join(output_dir, f"{filename}.{target_format.lower()}")
-                
-                # 处理不同模式的图片
-                if img.mode == "RGBA":
-                    # RGBA模式转JPEG需要先转换为RGB
-                    if target_format.lower() in ["jpg", "jpeg"]:
-                        img = img.convert("RGB")
-                elif img.mode == "P":
-                    # 调色板模式转换
-                    img = img.convert("RGB")
-                
-                # 转换格式并保存
-                format_name = target_format.upper()
-                if format_name == "JPG":
-                    format_name = "JPEG"
-                    
-                save_params = {
-                    "format": format_name,
-                    "quality": quality
-                }
-                
-                # 针对不同格式的特殊处理
-                if target_format.lower() == "png":
-                    save_params["optimize"] = True
-                elif target_format.lower() in ["jpg", "jpeg"]:
-                    save_params["optimize"] = True
-                    save_params["subsampling"] = 0
-                
-                img.save(output_path, **save_params)
-                
-                return True, img_path, output_path, None
-        except Exception as e:
-            return False, img_path, None, str(e)
-    
     def start_conversion(self):
         """开始转换（在新线程中执行）"""
         # 验证输入
@@ -210,97 +189,152 @@ class ImageConverterGUI:
             messagebox.showerror("错误", f"目录 '{self.input_dir.get()}' 不存在")
             return
         
-        # 获取图片文件
-        image_files = self.get_image_files(self.input_dir.get(), self.recursive.get())
-        if not image_files:
-            messagebox.showinfo("提示", "未找到图片文件")
+        try:
+            workers = max(1, self.workers.get())
+        except TclError:
+            messagebox.showerror("错误", "并行进程数必须是正整数")
+            return
+        
+        # 一次性读取参数，转换线程不再访问Tk变量
+        options = ConvertOptions(
+            self.target_format.get(), self.quality.get(), self.output_dir.get(),
+            profile=self.profile.get(), input_dir=self.input_dir.get(), workers=workers,
+        )
+        try:
+            options.validate()
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
             return
+        recursive = self.recursive.get()
         
         # 更新UI状态
         self.converting = True
-        self.total_files = len(image_files)
+        self.total_files = 0
         self.processed_files = 0
+        self.success_count = 0
+        self.fail_count = 0
+        self.report = None
+        self.scan_done = False
+        self.batch_done = False
+        self.cancel_event.clear()
         self.start_button.config(state=DISABLED)
         self.stop_button.config(state=NORMAL)
-        self.progress_bar.config(value=0, maximum=self.total_files)
+        self.progress_bar.config(value=0, maximum=1)
         self.progress_label.config(text="0/0")
-        self.status_label.config(text=f"找到 {self.total_files} 张图片，准备开始转换...")
+        self.status_label.config(text="正在扫描图片文件...")
         
-        # 在新线程中执行转换
+        # 在新线程中扫描和转换，界面定时刷新进度
         conversion_thread = threading.Thread(
             target=self.convert_batch,
-            args=(image_files,)
+            args=(options, recursive)
         )
         conversion_thread.daemon = True
         conversion_thread.start()
+        self.root.after(PROGRESS_INTERVAL_MS, self.poll_progress)
     
-    def convert_batch(self, image_files):
-        """批量转换图片"""
-        success_count = 0
-        fail_count = 0
-        fail_list = []
-        
-        for img_path in image_files:
-            if not self.converting:
-                break
-            
-            success, input_path, output_path, error = self.convert_image(
-                img_path, 
-                self.output_dir.get(), 
-                self.target_format.get(), 
-                self.quality.get()
-            )
-            
-            self.processed_files += 1
-            
-            if success:
-                success_count += 1
+    def convert_batch(self, options, recursive):
+        """批量转换图片（在后台线程中运行）"""
+        image_files = get_image_files(options.input_dir, recursive)
+        with self.progress_lock:
+            self.total_files = len(image_files)
+            self.scan_done = True
+        
+        # 每张图片的结果写入输出目录中的报告文件，内存中只保留前若干个失败项
+        report = None
+        try:
+            if image_files:
+                report = RunReport(os.path.join(options.targets[0]["output_dir"], REPORT_NAME))
             else:
-                fail_count += 1
-                fail_list.append((input_path, error))
-            
-            # 更新UI
-            self.root.after(0, self.update_progress, success_count, fail_count)
-        
-        # 转换完成
-        self.root.after(0, self.conversion_finished, success_count, fail_count, fail_list)
+                report = RunReport()
+            # 同名文件自动添加序号（默认的 suffix 策略）
+            for results in convert_batch(image_files, options, cancel_event=self.cancel_event, report=report):
+                success = results[0][0]
+                with self.progress_lock:
+                    self.processed_files += 1
+                    if success:
+                        self.success_count += 1
+                    else:
+                        self.fail_count += 1
+        except Exception as e:
+            if report is None:
+                report = RunReport()
+            report.add_result(False, options.input_dir, None, str(e), type(e).__name__)
+        finally:
+            if report is not None:
+                report.close()
+            with self.progress_lock:
+                self.report = report
+                self.batch_done = True
+    
+    def poll_progress(self):
+        """按固定频率刷新进度，转换完成后显示结果"""
+        with self.progress_lock:
+            scan_done = self.scan_done
+            batch_done = self.batch_done
+            success_count = self.success_count
+            fail_count = self.fail_count
+        
+        if scan_done:
+            self.update_progress(success_count, fail_count)
+        
+        if batch_done:
+            self.conversion_finished(success_count, fail_count, self.report)
+        else:
+            self.root.after(PROGRESS_INTERVAL_MS, self.poll_progress)
     
     def update_progress(self, success_count, fail_count):
         """更新进度"""
-        self.progress_bar.config(value=self.processed_files)
+        self.progress_bar.config(value=self.processed_files, maximum=max(1, self.total_files))
         self.progress_label.config(text=f"{self.processed_files}/{self.total_files}")
-        self.status_label.config(text=f"已转换 {self.processed_files}/{self.total_files} 张，成功 {success_count} 张，失败 {fail_count} 张")
+        if self.cancel_event.is_set():
+            self.status_label.config(text=f"正在停止，等待正在转换的图片完成...（已转换 {self.processed_files} 张）")
+        else:
+            self.status_label.config(text=f"已转换 {self.processed_files}/{self.total_files} 张，成功 {success_count} 张，失败 {fail_count} 张")
     
-    def conversion_finished(self, success_count, fail_count, fail_list):
+    def conversion_finished(self, success_count, fail_count, report):
         """转换完成处理"""
         self.converting = False
         self.start_button.config(state=NORMAL)
         self.stop_button.config(state=DISABLED)
+        fail_list = report.failures
         
-        if self.processed_files == 0:
+        if self.total_files == 0 and not fail_list:
+            self.progress_label.config(text="准备就绪")
+            self.status_label.config(text="未找到图片文件")
+            messagebox.showinfo("提示", "未找到图片文件")
+        elif self.processed_files == 0:
             self.progress_label.config(text="转换已取消")
             self.status_label.config(text="转换已取消")
             messagebox.showinfo("提示", "转换已取消")
         else:
-            self.progress_label.config(text="转换完成")
-            self.status_label.config(text=f"转换完成：成功 {success_count} 张，失败 {fail_count} 张")
+            stopped = self.cancel_event.is_set() and self.processed_files < self.total_files
+            title = "转换已停止" if stopped else "转换完成"
+            self.progress_label.config(text=title)
+            self.status_label.config(text=f"{title}：成功 {success_count} 张，失败 {fail_count} 张")
             
             # 显示结果
-            result_msg = f"转换完成！\n\n成功：{success_count} 张\n失败：{fail_count} 张\n\n输出目录：{os.path.abspath(self.output_dir.get())}"
+            result_msg = f"{title}！\n\n成功：{success_count} 张\n失败：{fail_count} 张\n\n输出目录：{os.path.abspath(self.output_dir.get())}"
+            if stopped:
+                result_msg += f"\n\n未处理：{self.total_files - self.processed_files} 张"
             
             if fail_list:
-                result_msg += f"\n\n失败列表（显示前5个）："
-                for i, (img_path, error) in enumerate(fail_list[:5]):
+                result_msg += f"\n\n失败列表（显示前{SHOWN_FAILURES}个）："
+                for i, (img_path, error) in enumerate(fail_list[:SHOWN_FAILURES]):
                     result_msg += f"\n{i+1}. {os.path.basename(img_path)}: {error[:50]}..."
-                if len(fail_list) > 5:
-                    result_msg += f"\n... 还有 {len(fail_list) - 5} 个失败项"
+                if report.fail_count > SHOWN_FAILURES:
+                    result_msg += f"\n... 还有 {report.fail_count - SHOWN_FAILURES} 个失败项"
+                if report.path:
+                    result_msg += f"\n\n完整结果见报告文件：{os.path.abspath(report.path)}"
             
-            messagebox.showinfo("转换完成", result_msg)
+            messagebox.showinfo(title, result_msg)
     
     def stop_conversion(self):
-        """停止转换"""
+        """停止转换：不再提交新任务并取消排队中的任务"""
         if messagebox.askyesno("确认", "确定要停止转换吗？"):
             self.converting = False
+            self.cancel_event.set()
+            self.stop_button.config(state=DISABLED)
+            self.status_label.config(text="正在停止，等待正在转换的图片完成...")
 
 if __name__ == "__main__":
     root = Tk()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片格式转换性能基准测试
+生成不同类型的测试图片，对每种目标格式和关键保存参数测量转换吞吐量，
+结果以JSON输出，便于在不同版本之间比较
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import PIL
+
+from image_converter_core import (
+    SUPPORTED_FORMATS, METRIC_STAGES, ENCODE_PROFILES, DEFAULT_PROFILE,
+    make_target, convert_targets,
+)
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+# 测试图片：(名称, 保存格式, 颜色模式, 尺寸, 帧数)
+CORPUS = [
+    ("photo_small", "jpg", "RGB", (640, 480), 1),
+    ("photo_large", "jpg", "RGB", (4000, 3000), 1),
+    ("photo_png", "png", "RGB", (1920, 1080), 1),
+    ("alpha", "png", "RGBA", (1024, 768), 1),
+    ("palette", "png", "P", (800, 600), 1),
+    ("animated", "gif", "P", (320, 240), 10),
+]
+
+# 各格式额外测试的保存参数（在默认编码配置的基础上覆盖）
+OPTION_VARIANTS = {
+    "jpg": [
+        {"quality": 50},
+        {"quality": 95},
+        {"optimize": False},
+        {"subsampling": 2},
+        {"optimize": False, "subsampling": 2},
+    ],
+    "png": [
+        {"optimize": False},
+    ],
+    "webp": [
+        {"quality": 50},
+        {"quality": 95},
+    ],
+}
+
+def synthesize_image(mode, size, seed=0):
+    """
+    生成一张接近照片的测试图片（渐变叠加噪点）
+
+    Args:
+        mode: 颜色模式（RGB、RGBA、P）
+        size: 尺寸 (宽, 高)
+        seed: 用于区分动画各帧的序号
+
+    Returns:
+        Image: 测试图片
+    """
+    gradient = Image.linear_gradient("L").resize(size)
+    radial = Image.radial_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 48)
+    base = Image.merge("RGB", [gradient, radial, noise])
+    if seed:
+        base = base.rotate(seed * 36)
+    photo = Image.blend(base, Image.effect_noise(size, 24).convert("RGB"), 0.25)
+
+    if mode == "RGBA":
+        photo.putalpha(radial)
+    elif mode == "P":
+        photo = photo.quantize(colors=64)
+    return photo
+
+def build_corpus(corpus_dir, quick=False):
+    """
+    在目录中生成测试图片
+
+    Args:
+        corpus_dir: 输出目录
+        quick: 为True时尺寸缩小到四分之一，用于快速检查
+
+    Returns:
+        list: 每张测试图片的信息字典
+    """
+    corpus = []
+    for name, file_format, mode, size, frames in CORPUS:
+        if quick:
+            size = (max(16, size[0] // 4), max(16, size[1] // 4))
+        path = os.path.join(corpus_dir, f"{name}.{file_format}")
+        images = [synthesize_image(mode, size, seed) for seed in range(frames)]
+        if frames > 1:
+            images[0].save(path, save_all=True, append_images=images[1:], duration=100, loop=0)
+        else:
+            images[0].save(path)
+        corpus.append({
+            "name": name,
+            "path": path,
+            "mode": mode,
+            "size": list(size),
+            "frames": frames,
+            "bytes": os.path.getsize(path),
+        })
+    return corpus
+
+def peak_rss_kb():
+    """
+    当前进程的峰值常驻内存（KB），不支持的平台返回None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位是字节，Linux 是KB
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+def run_case(corpus, target_format, profile, options, output_dir, repeat):
+    """
+    测量一种目标格式和保存参数的组合（在独立子进程中运行，以便统计峰值内存）
+
+    Args:
+        corpus: 测试图片信息列表
+        target_format: 目标格式
+        profile: 编码配置
+        options: 覆盖编码配置的保存参数
+        output_dir: 输出目录
+        repeat: 重复次数
+
+    Returns:
+        dict: 测量结果
+    """
+    options = dict(options)
+    quality = options.pop("quality", 85)
+    target = make_target(target_format, quality, output_dir, profile=profile, save_options=options)
+
+    images = 0
+    failures = []
+    bytes_in = 0
+    bytes_out = 0
+    stages = {stage: 0.0 for stage in METRIC_STAGES if stage != "total"}
+
+    # 调用 convert_image 使用的同一转换函数，并收集各阶段耗时
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in corpus:
+            output_path = os.path.join(output_dir, f"{item['name']}.{target_format}")
+            stats = {}
+            success, _, _, error = convert_targets(item["path"], [target], [output_path], stats)[0]
+            for stage in stages:
+                stages[stage] += stats[stage]
+            if success:
+                images += 1
+                bytes_in += item["bytes"]
+                bytes_out += os.path.getsize(output_path)
+            else:
+                failures.append({"name": item["name"], "error": error})
+    elapsed = time.perf_counter() - start
+
+    return {
+        "format": target_format,
+        "profile": profile,
+        "quality": quality,
+        "options": options,
+        "images": images,
+        "failures": failures,
+        "seconds": round(elapsed, 6),
+        "images_per_sec": round(images / elapsed, 3) if elapsed else None,
+        "mb_per_sec": round(bytes_in / elapsed / 1e6, 3) if elapsed else None,
+        "stage_seconds": {stage: round(seconds, 6) for stage, seconds in stages.items()},
+        "peak_rss_kb": peak_rss_kb(),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "size_ratio": round(bytes_out / bytes_in, 4) if bytes_in else None,
+    }
+
+def main():
+    """
+    主函数
+    
+    Returns:
+        int: 退出码，完成时为0，参数错误时为2
+    """
+    parser = argparse.ArgumentParser(description="图片格式转换性能基准测试")
+    parser.add_argument("-o", "--output", help="结果JSON文件路径，默认输出到标准输出")
+    parser.add_argument("-f", "--formats", help="要测试的目标格式，以逗号分隔，默认测试所有支持的格式")
+    parser.add_argument("--repeat", type=int, default=3, help="每种组合重复转换的次数，默认3")
+    parser.add_argument("--quick", action="store_true", help="使用较小的测试图片快速检查")
+    parser.add_argument("--keep", action="store_true", help="保留生成的测试图片和输出文件")
+    args = parser.parse_args()
+
+    if args.formats:
+        formats = [fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip()]
+        for fmt in formats:
+            if fmt not in SUPPORTED_FORMATS:
+                print(f"错误：不支持的格式 '{fmt}'", file=sys.stderr)
+                return 2
+    else:
+        # jpeg、tif 与 jpg、tiff 是同一种格式，不重复测试
+        formats = [fmt for fmt in SUPPORTED_FORMATS if fmt not in ("jpeg", "tif")]
+
+    work_dir = tempfile.mkdtemp(prefix="image_converter_bench_")
+    try:
+        corpus_dir = os.path.join(work_dir, "corpus")
+        os.makedirs(corpus_dir)
+        print("正在生成测试图片...", file=sys.stderr)
+        corpus = build_corpus(corpus_dir, args.quick)
+
+        cases = []
+        for fmt in formats:
+            cases.extend((fmt, profile, {}) for profile in ENCODE_PROFILES)
+            cases.extend((fmt, DEFAULT_PROFILE, options) for options in OPTION_VARIANTS.get(fmt, []))
+
+        results = []
+        for index, (fmt, profile, options) in enumerate(cases):
+            output_dir = os.path.join(work_dir, f"output_{index}")
+            os.makedirs(output_dir)
+            print(f"[{index + 1}/{len(cases)}] {fmt} {profile} {options or ''}", file=sys.stderr)
+            # 每个组合使用新的子进程，峰值内存互不影响
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                results.append(executor.submit(run_case, corpus, fmt, profile, options, output_dir, args.repeat).result())
+
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "repeat": args.repeat,
+                "quick": args.quick,
+            },
+            "corpus": [{key: value for key, value in item.items() if key != "path"} for item in corpus],
+            "results": results,
+        }
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"结果已保存到 {os.path.abspath(args.output)}", file=sys.stderr)
+        else:
+            print(text)
+    finally:
+        if args.keep:
+            print(f"测试文件保留在 {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
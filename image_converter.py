@@ -6,97 +6,526 @@
 """
 
 import os
-import glob
+import io
 import argparse
+import contextlib
 import sys
-from PIL import Image
-from tqdm import tqdm
+import time
+import signal
 
-def convert_image(img_path, output_dir, target_format, quality=85):
+# 转换核心位于 image_converter_core；convert_image、get_image_files 保持原有的 image_converter.xxx 用法可用
+from image_converter_core import (
+    DEFAULT_WORKERS, IMAGE_EXTENSIONS, SUPPORTED_FORMATS, ENCODE_PROFILES, DEFAULT_PROFILE,
+    PASSTHROUGH_METHODS, CONFLICT_POLICIES, DEFAULT_CACHE_SIZE,
+    ConvertOptions, Manifest, ConversionMetrics, RunReport, OutputPlanner, ArchiveWriter, WorkerPool,
+    parse_size, parse_bytes, parse_background, parse_target, detect_archive, iter_archive_images,
+    archive_format_from_path, safe_member_path,
+    convert_image, convert_batch, convert_members, convert_source, Journal, ConversionCache, write_atomic, temp_path_for,
+    iter_image_files, count_image_files, estimate_pixels, get_image_files,
+)
+
+def bytes_argument(value):
+    """
+    argparse 使用的字节数参数类型（见 parse_bytes）
+    """
+    try:
+        return parse_bytes(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def size_argument(value):
+    """
+    argparse 使用的尺寸参数类型（见 parse_size）
+    """
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def background_argument(value):
+    """
+    argparse 使用的背景色参数类型（见 parse_background）
+    """
+    try:
+        return parse_background(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def shard_argument(value):
+    """
+    argparse 使用的分片参数类型（见 parse_shard）
+    """
+    from image_converter_jobs import parse_shard
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+class NullProgress:
+    """
+    不显示进度时代替 tqdm 的进度条
     """
-    转换单张图片的格式
     
-    Args:
-        img_path: 输入图片路径
-        output_dir: 输出目录路径
-        target_format: 目标格式（如jpg、png等）
-        quality: 输出图片质量（0-100）
-        
-    Returns:
-        tuple: (是否成功, 输入路径, 输出路径, 错误信息)
+    def __init__(self, iterable=None):
+        self.iterable = iterable
+    
+    def __iter__(self):
+        return iter(self.iterable)
+    
+    def update(self, n=1):
+        pass
+    
+    def close(self):
+        pass
+
+def progress_bar(iterable=None, **kwargs):
+    """
+    进度条：标准错误是终端时才导入 tqdm（导入需要几十毫秒，单张图片的转换往往更快），
+    输出被重定向到日志或管道时不显示进度
+    """
+    if not sys.stderr.isatty():
+        return NullProgress(iterable)
+    from tqdm import tqdm
+    return tqdm(iterable, **kwargs)
+
+class PrefixedStream:
+    """
+    先返回已经读取的开头数据，再继续读取原始流（用于判断标准输入的类型后接着读取）
+    """
+    
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+    
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b""
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+def remove_file(path):
+    """
+    删除文件（文件不存在时忽略）
     """
     try:
-        # 打开图片
-        with Image.open(img_path) as img:
-            # 确保输出目录存在
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # 获取文件名（不含扩展名）
-            filename = os.path.splitext(os.path.basename(img_path))[0]
-            # 设置输出路径
-            output_path = os.path.join(output_dir, f"{filename}.{target_format.lower()}")
-            
-            # 处理不同模式的图片
-            if img.mode == "RGBA":
-                # RGBA模式转JPEG需要先转换为RGB
-                if target_format.lower() in ["jpg", "jpeg"]:
-                    img = img.convert("RGB")
-            elif img.mode == "P":
-                # 调色板模式转换
-                img = img.convert("RGB")
+        os.remove(path)
+    except OSError:
+        pass
+
+def archive_mode(args, options):
+    """
+    压缩包和流模式：输入或输出是 zip/tar 压缩包、标准输入或标准输出
+    
+    压缩包中的图片直接在内存中读取和转换，转换结果直接写入输出压缩包或输出目录，
+    不解压到磁盘。图片并行转换，输出压缩包中的文件按完成顺序排列。
+    输出到标准输出时，提示信息和进度都输出到标准错误，不会混入转换结果。
+    输入为单张图片文件（而不是压缩包）时交给 single_mode。
+    
+    Returns:
+        int: 退出码，全部成功时为0，有失败时为1，参数或输入错误时为2
+    """
+    target = options.targets[0]
+    log = sys.stderr if args.output == "-" else sys.stdout
+    
+    with contextlib.ExitStack() as stack:
+        # 输入：标准输入、压缩包文件或目录
+        if args.input == "-":
+            stdin = sys.stdin.buffer
+            head = stdin.read(512)
+            input_format = detect_archive(head)
+            if input_format is None:
+                # 单张图片
+                if args.output != "-":
+                    print("错误：标准输入为单张图片时需要使用 -o - 输出到标准输出", file=log)
+                    return 2
+                return single_mode(args, target, log, head + stdin.read())
+            if input_format == "zip":
+                # zip 的目录位于文件末尾，需要完整读入
+                source = io.BytesIO(head + stdin.read())
+            else:
+                source = PrefixedStream(head, stdin)
+            members = iter_archive_images(source, input_format)
+        elif os.path.isfile(args.input):
+            source = stack.enter_context(open(args.input, "rb"))
+            input_format = detect_archive(source.read(512))
+            source.seek(0)
+            if input_format is None and os.path.splitext(args.input)[1].lower() in IMAGE_EXTENSIONS:
+                source.close()
+                if not archive_format_from_path(args.output):
+                    return single_mode(args, target, log)
+                # 单张图片输出到压缩包：与目录输入一样写入压缩包
+                members = [(os.path.basename(args.input), args.input)]
+            elif input_format is None:
+                print(f"错误：输入文件 '{args.input}' 不是 zip 或 tar 压缩包", file=log)
+                return 2
+            else:
+                members = iter_archive_images(source, input_format)
+        elif os.path.isdir(args.input):
+            input_format = None
+            members = (
+                (os.path.relpath(img_path, args.input).replace(os.sep, "/"), img_path)
+                for img_path in iter_image_files(args.input, args.recursive)
+            )
+        else:
+            print(f"错误：输入目录 '{args.input}' 不存在", file=log)
+            return 2
+        
+        report = stack.enter_context(contextlib.closing(RunReport(args.report)))
+        skipped_count = 0
+        writer = None
+        
+        # 输出：在提交转换前确定每张图片的输出位置
+        if args.output == "-" or archive_format_from_path(args.output):
+            if args.output == "-":
+                output_format, compression = input_format or "tar", ""
+                fileobj = sys.stdout.buffer
+            else:
+                output_format, compression = archive_format_from_path(args.output)
+                output_dir = os.path.dirname(args.output)
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+                # 先写入临时文件，全部完成后再替换，中断时不会留下不完整的压缩包
+                temp_path = temp_path_for(args.output)
+                fileobj = stack.enter_context(open(temp_path, "wb"))
+                stack.callback(remove_file, temp_path)
+            writer = stack.enter_context(ArchiveWriter(fileobj, output_format, compression))
             
-            # 转换格式并保存
-            # 处理JPG格式名称映射
-            format_name = target_format.upper()
-            if format_name == "JPG":
-                format_name = "JPEG"
-                
-            save_params = {
-                "format": format_name,
-                "quality": quality
-            }
+            # 转换的名称为 (输出名称, 输入名称)，输入名称用于报告
+            def tasks():
+                for name, source in members:
+                    # 压缩包输入保留包内路径；目录输入与输出到目录时一样由 --keep-structure 决定
+                    output_name = os.path.basename(name) if input_format is None and not args.keep_structure else name
+                    yield (writer.member_name(output_name, target["format"]), name), source
             
-            # 针对不同格式的特殊处理
-            if target_format.lower() == "png":
-                save_params["optimize"] = True
-            elif target_format.lower() in ["jpg", "jpeg"]:
-                save_params["optimize"] = True
-                save_params["subsampling"] = 0
+            def store(name, data):
+                writer.add(name, data)
+        else:
+            # 以压缩包路径作为虚拟的输入目录，--keep-structure 保留包内的子目录
+            root = os.path.abspath(args.input)
+            planner = OutputPlanner(root, args.output, target["format"], args.keep_structure, args.on_conflict)
             
-            img.save(output_path, **save_params)
+            def tasks():
+                nonlocal skipped_count
+                for name, source in members:
+                    member_path = safe_member_path(name)
+                    if member_path is None:
+                        report.add_result(False, name, None, "不安全的路径，已忽略", "ValueError")
+                        continue
+                    try:
+                        output_path = planner.plan(os.path.join(root, member_path))
+                    except FileExistsError as e:
+                        report.add_result(False, name, None, str(e), type(e).__name__)
+                        continue
+                    if output_path is None:
+                        skipped_count += 1
+                        continue
+                    yield (output_path, name), source
             
-            return True, img_path, output_path, None
-    except Exception as e:
-        return False, img_path, None, str(e)
+            def store(output_path, data):
+                write_atomic(output_path, data)
+        
+        print(f"开始转换为 {target['format'].upper()} 格式...", file=log)
+        progress = progress_bar(desc="转换进度", file=sys.stderr)
+        try:
+            for (output_name, input_name), success, data, error, stats in convert_members(
+                    tasks(), target, options.workers, memory_budget=options.memory_budget):
+                progress.update(1)
+                if success:
+                    store(output_name, data)
+                report.add_result(success, input_name, output_name, error, stats["error_type"], stats["bytes_in"],
+                                  len(data) if success else None, stats["total"])
+        finally:
+            progress.close()
+        
+        if writer is not None:
+            writer.close()
+            if fileobj is not sys.stdout.buffer:
+                fileobj.close()
+                os.replace(temp_path, args.output)
+    
+    if args.output == "-":
+        sys.stdout.buffer.flush()
+    
+    print("\n转换完成！", file=log)
+    print(f"成功：{report.success_count} 张", file=log)
+    print(f"失败：{report.fail_count} 张", file=log)
+    if skipped_count:
+        print(f"因文件名冲突跳过：{skipped_count} 张", file=log)
+    report.print_failures(log)
+    if args.output != "-":
+        print(f"\n输出位置：{os.path.abspath(args.output)}", file=log)
+    if args.report:
+        print(f"报告文件：{os.path.abspath(args.report)}", file=log)
+    return 1 if report.fail_count else 0
 
-def get_image_files(input_dir, recursive=False):
+def single_mode(args, target, log, data=None):
     """
-    获取目录下所有图片文件
+    单张图片：在当前进程中直接转换，不创建进程池，也不显示进度条
+    
+    -o 为图片文件路径时写入该文件，为 - 时写入标准输出，否则作为输出目录。
+    指定 --report 时与批量转换一样写入一行结果和汇总。
     
     Args:
-        input_dir: 输入目录
-        recursive: 是否递归处理子目录
+        data: 从标准输入读取的图片数据，为None时转换 -i 指定的文件
         
     Returns:
-        list: 图片文件路径列表
+        int: 退出码，成功时为0，失败时为1
     """
-    # 支持的图片扩展名
-    image_extensions = [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif", ".webp", ".ico"]
+    if args.output == "-":
+        output_path = "-"
+    elif os.path.splitext(args.output)[1].lower() in IMAGE_EXTENSIONS:
+        output_path = args.output
+    else:
+        filename = os.path.splitext(os.path.basename(args.input))[0]
+        output_path = os.path.join(args.output, f"{filename}.{target['format']}")
     
-    image_files = []
+    with contextlib.closing(RunReport(args.report)) as report:
+        start = time.perf_counter()
+        bytes_in = None
+        try:
+            bytes_in = len(data) if data is not None else os.path.getsize(args.input)
+            source = data if data is not None else args.input
+            if output_path == "-":
+                result = convert_source(source, target)
+                sys.stdout.buffer.write(result)
+                sys.stdout.buffer.flush()
+                bytes_out = len(result)
+            else:
+                convert_source(source, target, output_path)
+                bytes_out = os.path.getsize(output_path)
+        except Exception as e:
+            report.add_result(False, args.input, output_path, str(e), type(e).__name__, bytes_in,
+                              duration=time.perf_counter() - start)
+            print(f"错误：转换失败：{e}", file=log)
+            return 1
+        report.add_result(True, args.input, output_path, bytes_in=bytes_in, bytes_out=bytes_out,
+                          duration=time.perf_counter() - start)
+    if output_path != "-":
+        print(f"{args.input} -> {output_path}", file=log)
+    return 0
+
+def serve_mode(args):
+    """
+    转换服务：常驻进程在 Unix 套接字上接受转换请求（见 image_converter_server），
+    请求中未指定的参数使用命令行参数。按 Ctrl+C 或发送 SIGTERM 停止。
+    """
+    from image_converter_server import ConversionServer
+    
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    
+    try:
+        server = ConversionServer(args.serve, job_defaults(args), args.workers)
+    except OSError as e:
+        print(f"错误：{e}")
+        return 2
+    with server:
+        print(f"转换服务已启动：{os.path.abspath(args.serve)}（{args.workers} 个进程），按 Ctrl+C 停止")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n转换服务已停止")
+    return 0
+
+def watch_mode(args, options):
+    """
+    监视模式：先转换输入目录中已有的图片，再持续转换新增或修改的图片
+    
+    进程池在整个监视期间保持运行，不必每次重新启动进程；
+    不再重复完整扫描目录（未安装 watchdog 或指定 --poll 时除外）。按 Ctrl+C 或发送 SIGTERM 停止。
+    作为服务正常停止时退出码总是0，单张图片的失败记录在输出和报告文件中。
+    """
+    from image_converter_watch import DirectoryWatcher
     
-    if recursive:
-        # 递归获取所有图片文件
-        for root, _, files in os.walk(input_dir):
-            for file in files:
-                if os.path.splitext(file)[1].lower() in image_extensions:
-                    image_files.append(os.path.join(root, file))
+    # 作为服务运行时用 SIGTERM 停止，与 Ctrl+C 一样正常退出
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    
+    params = options.manifest_params()
+    manifest = Manifest(args.output, use_hash=args.hash) if args.incremental else None
+    metrics = None
+    if args.metrics or args.metrics_jsonl or args.metrics_prom:
+        metrics = ConversionMetrics(args.metrics_jsonl)
+    
+    # 输出目录位于输入目录中时，不要把输出当作新图片
+    watcher = DirectoryWatcher(args.input, args.recursive, settle=args.settle, polling=args.poll,
+                               ignore_dirs=[target["output_dir"] for target in options.targets])
+    
+    def should_convert(img_path, output_paths):
+        return not manifest or manifest.needs_conversion(img_path, params, output_paths)
+    
+    # 长期运行时失败项只打印，不在内存中保留
+    report = RunReport(args.report, keep_failures=0)
+    
+    def run(paths, executor):
+        for results in convert_batch(paths, options, metrics, should_convert=should_convert, executor=executor, report=report):
+            stamp = time.strftime("%H:%M:%S")
+            for success, input_path, output_path, error in results:
+                if success:
+                    print(f"[{stamp}] {input_path} -> {output_path}")
+                else:
+                    print(f"[{stamp}] 失败：{input_path}: {error}")
+            if manifest and all(result[0] for result in results):
+                manifest.record(results[0][1], [result[2] for result in results])
+        if manifest:
+            manifest.save()
+        if options.cache:
+            options.cache.evict()
+    
+    # 子进程异常退出后进程池在下次提交时自动重建，监视不会因此停止
+    pool = WorkerPool(options.workers) if options.workers > 1 else None
+    try:
+        # 先开始监视，转换已有图片期间新增的文件也不会遗漏
+        watcher.start()
+        print("正在转换已有的图片...")
+        run((path for path in iter_image_files(args.input, args.recursive) if not watcher.is_ignored(path)), pool)
+        print(f"正在监视 {os.path.abspath(args.input)}（{watcher.backend}），按 Ctrl+C 停止")
+        while True:
+            run(watcher.wait(), pool)
+    except KeyboardInterrupt:
+        print("\n已停止监视")
+    finally:
+        watcher.stop()
+        if pool is not None:
+            pool.shutdown()
+        if metrics:
+            metrics.close()
+        report.close()
+    
+    print(f"成功：{report.success_count} 张")
+    print(f"失败：{report.fail_count} 张")
+    if metrics:
+        metrics.print_summary()
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+    return 0
+
+def job_defaults(args):
+    """
+    任务文件中未指定的字段使用的默认值（make_target 的关键字参数）
+    """
+    defaults = {"quality": args.quality, "output_dir": args.output, "max_size": args.max_size, "scale": args.scale,
+                "profile": args.profile, "passthrough": args.passthrough, "background": args.background,
+                "max_bytes": args.max_bytes, "shrink_to_fit": args.shrink_to_fit}
+    if args.format:
+        defaults["target_format"] = args.format
+    return defaults
+
+def job_mode(args):
+    """
+    任务文件模式：按任务文件逐项转换，指定 --shard 时只转换属于该分片的任务
+    
+    每个任务的结果立即追加到结果文件，分片被中断后可以用 --resume 继续；
+    各分片完成后用 --merge 合并结果文件。
+    
+    Returns:
+        int: 退出码，全部成功时为0，有失败时为1，参数或任务文件错误时为2
+    """
+    from image_converter_jobs import iter_jobs, results_path_for, ShardResults, convert_jobs
+    
+    if args.workers < 1:
+        print(f"错误：并行进程数必须大于0，当前值为 {args.workers}")
+        return 2
+    defaults = job_defaults(args)
+    
+    # 先完整读取一遍：任务文件中的错误在开始转换前报告，同时得到进度条的总数
+    print(f"正在读取任务文件...")
+    try:
+        total = sum(1 for _ in iter_jobs(args.jobs, defaults, args.shard))
+    except (OSError, ValueError) as e:
+        print(f"错误：{e}")
+        return 2
+    if args.shard:
+        print(f"分片 {args.shard[0]}/{args.shard[1]} 共有 {total} 个任务")
     else:
-        # 获取当前目录下所有图片文件
-        for ext in image_extensions:
-            image_files.extend(glob.glob(os.path.join(input_dir, f"*{ext}"), recursive=False))
+        print(f"共有 {total} 个任务")
+    
+    results = ShardResults(args.results or results_path_for(args.jobs, args.shard), resume=args.resume)
+    cache = ConversionCache(args.cache, args.cache_size) if args.cache else None
+    metrics = None
+    if args.metrics or args.metrics_jsonl or args.metrics_prom:
+        metrics = ConversionMetrics(args.metrics_jsonl)
+    
+    report = RunReport(args.report)
+    progress = progress_bar(total=total, desc="转换进度")
+    
+    def should_convert(input_path, output_path):
+        # 继续中断的分片：跳过已经完成的任务
+        return not results.is_done(input_path, output_path)
+    
+    try:
+        jobs = iter_jobs(args.jobs, defaults, args.shard)
+        for success, input_path, output_path, error in convert_jobs(
+                jobs, args.workers, metrics, memory_budget=args.memory_budget, cache=cache,
+                should_convert=should_convert, on_skip=lambda input_path, output_path: progress.update(1), report=report):
+            results.record(success, input_path, output_path, error)
+            progress.update(1)
+    finally:
+        progress.close()
+        results.close()
+        report.close()
+        if metrics:
+            metrics.close()
+        if cache:
+            cache.evict()
+    
+    print("\n转换完成！")
+    print(f"成功：{report.success_count} 张")
+    print(f"失败：{report.fail_count} 张")
+    if results.skipped:
+        print(f"中断前已完成：{results.skipped} 张")
+    report.print_failures()
+    if metrics:
+        metrics.print_summary()
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+    print(f"\n结果文件：{os.path.abspath(results.path)}")
+    if args.report:
+        print(f"报告文件：{os.path.abspath(args.report)}")
+    return 1 if report.fail_count else 0
+
+def merge_mode(args):
+    """
+    合并各分片的结果文件，汇总成功和失败的任务；同时指定 --jobs 时检查没有结果的任务
+    
+    Returns:
+        int: 退出码，全部成功时为0，有失败或没有结果的任务时为1，任务文件错误时为2
+    """
+    from image_converter_jobs import iter_jobs, merge_results
+    
+    merged = merge_results(args.merge, args.results)
+    failed = [entry for entry in merged.values() if not entry.get("ok")]
+    print(f"合并了 {len(args.merge)} 个结果文件，共 {len(merged)} 个任务")
+    print(f"成功：{len(merged) - len(failed)} 张")
+    print(f"失败：{len(failed)} 张")
     
-    return image_files
+    missing = []
+    if args.jobs:
+        try:
+            missing = [job for job in iter_jobs(args.jobs, job_defaults(args)) if (job[0], job[1]) not in merged]
+        except (OSError, ValueError) as e:
+            print(f"错误：{e}")
+            return 2
+        print(f"没有结果：{len(missing)} 个任务")
+    
+    if failed:
+        print("\n失败列表：")
+        for entry in failed:
+            print(f"  {entry['input']}: {entry.get('error')}")
+    if missing:
+        print("\n没有结果的任务（分片未运行或未完成）：")
+        for input_path, output_path, _ in missing:
+            print(f"  {input_path} -> {output_path}")
+    if args.results:
+        print(f"\n合并后的结果文件：{os.path.abspath(args.results)}")
+    return 1 if failed or missing else 0
 
 def interactive_mode():
     """
@@ -141,7 +570,7 @@ def interactive_mode():
                 output_dir = "output"
             
             # 获取目标格式
-            supported_formats = ["jpg", "jpeg", "png", "bmp", "gif", "tiff", "tif", "webp", "ico"]
+            supported_formats = SUPPORTED_FORMATS
             target_format = input(f"请输入目标格式 ({'/'.join(supported_formats)}): ").strip().lower()
             while target_format not in supported_formats:
                 print(f"错误：不支持的格式 '{target_format}'，请从支持的格式中选择")
@@ -151,6 +580,12 @@ def interactive_mode():
             recursive = input("是否递归处理子目录？(y/n，默认: n): ").strip().lower()
             recursive = recursive == "y"
             
+            # 获取是否保留目录结构
+            keep_structure = False
+            if recursive:
+                keep_structure = input("是否在输出目录中保留子目录结构？(y/n，默认: n): ").strip().lower()
+                keep_structure = keep_structure == "y"
+            
             # 获取质量参数
             quality = input("请输入图片质量 (0-100，默认: 85): ").strip()
             if not quality:
@@ -165,6 +600,28 @@ def interactive_mode():
                     print("警告：无效的质量参数，使用默认值 85")
                     quality = 85
             
+            # 获取编码配置
+            profile = input(f"请选择编码配置 (fast速度优先/balanced均衡/smallest体积最小，默认: {DEFAULT_PROFILE}): ").strip().lower()
+            if not profile:
+                profile = DEFAULT_PROFILE
+            elif profile not in ENCODE_PROFILES:
+                print(f"警告：无效的编码配置，使用默认值 {DEFAULT_PROFILE}")
+                profile = DEFAULT_PROFILE
+            
+            # 获取并行进程数
+            workers = input(f"请输入并行进程数 (默认: {DEFAULT_WORKERS}): ").strip()
+            if not workers:
+                workers = DEFAULT_WORKERS
+            else:
+                try:
+                    workers = int(workers)
+                    if workers < 1:
+                        print(f"警告：进程数必须大于0，使用默认值 {DEFAULT_WORKERS}")
+                        workers = DEFAULT_WORKERS
+                except ValueError:
+                    print(f"警告：无效的进程数，使用默认值 {DEFAULT_WORKERS}")
+                    workers = DEFAULT_WORKERS
+            
             # 确认参数
             print("\n" + "-" * 30)
             print("转换参数确认")
@@ -173,7 +630,11 @@ def interactive_mode():
             print(f"输出目录: {output_dir}")
             print(f"目标格式: {target_format}")
             print(f"递归处理: {'是' if recursive else '否'}")
+            if recursive:
+                print(f"保留目录结构: {'是' if keep_structure else '否'}")
             print(f"图片质量: {quality}")
+            print(f"编码配置: {profile}")
+            print(f"并行进程: {workers}")
             
             confirm = input("\n是否开始转换？(y/n): ").strip().lower()
             if confirm != "y":
@@ -191,33 +652,23 @@ def interactive_mode():
             print(f"找到 {len(image_files)} 张图片")
             print(f"开始转换为 {target_format.upper()} 格式...")
             
-            success_count = 0
-            fail_count = 0
-            fail_list = []
+            # 同名文件自动添加序号（默认的 suffix 策略）
+            options = ConvertOptions(target_format, quality, output_dir, profile=profile, input_dir=input_dir,
+                                     keep_structure=keep_structure, workers=workers)
             
-            # 使用tqdm显示进度
-            for img_path in tqdm(image_files, desc="转换进度"):
-                success, input_path, output_path, error = convert_image(
-                    img_path, output_dir, target_format, quality
-                )
-                
-                if success:
-                    success_count += 1
-                else:
-                    fail_count += 1
-                    fail_list.append((input_path, error))
+            # 使用tqdm显示进度，结果由 RunReport 汇总（只保留前若干个失败项）
+            report = RunReport()
+            batches = convert_batch(image_files, options, report=report)
+            for results in progress_bar(batches, total=len(image_files), desc="转换进度"):
+                pass
             
             # 输出转换结果
             print("\n" + "=" * 30)
             print("转换完成！")
             print("=" * 30)
-            print(f"成功：{success_count} 张")
-            print(f"失败：{fail_count} 张")
-            
-            if fail_list:
-                print("\n失败列表：")
-                for img_path, error in fail_list:
-                    print(f"  {img_path}: {error}")
+            print(f"成功：{report.success_count} 张")
+            print(f"失败：{report.fail_count} 张")
+            report.print_failures()
             
             print(f"\n输出目录：{os.path.abspath(output_dir)}")
             print("\n" + "=" * 30)
@@ -241,72 +692,248 @@ def interactive_mode():
 def main():
     """
     主函数
+    
+    Returns:
+        int: 退出码，全部成功时为0，有图片转换失败时为1，参数、输入或任务文件错误时为2
     """
     # 判断是否使用命令行参数
     if len(sys.argv) > 1:
         # 命令行模式
         parser = argparse.ArgumentParser(description="批量图片格式转换器")
-        parser.add_argument("-i", "--input", required=True, help="输入目录路径")
-        parser.add_argument("-o", "--output", default="output", help="输出目录路径，默认创建output目录")
-        parser.add_argument("-f", "--format", required=True, help="目标格式，如jpg、png等")
+        parser.add_argument("-i", "--input", help="输入目录或 zip/tar 压缩包路径；为 - 时从标准输入读取单张图片或压缩包（流模式）")
+        parser.add_argument("-o", "--output", default="output", help="输出目录路径，默认创建output目录；以 .zip/.tar/.tar.gz 等结尾时写入压缩包，为 - 时写入标准输出")
+        parser.add_argument("-f", "--format", help="目标格式，如jpg、png等（使用 --target 时可省略）")
         parser.add_argument("-r", "--recursive", action="store_true", help="递归处理子目录")
         parser.add_argument("-q", "--quality", type=int, default=85, help="输出图片质量（0-100），默认85")
+        parser.add_argument("-p", "--profile", choices=list(ENCODE_PROFILES), default=DEFAULT_PROFILE, help=f"编码配置：fast速度优先、balanced均衡、smallest体积最小，默认{DEFAULT_PROFILE}")
+        parser.add_argument("--max-size", type=size_argument, help="最大输出尺寸（宽x高，如 1920x1080），超过时等比缩小")
+        parser.add_argument("--scale", type=float, help="缩放比例，如 0.5 表示缩小一半")
+        parser.add_argument("--background", type=background_argument, help="输出格式不支持透明（如JPEG、BMP）时，透明部分合成到的背景色，如 white、#000000，默认白色")
+        parser.add_argument("--max-bytes", type=bytes_argument, help="输出文件大小上限，如 200K；JPEG、WebP 自动降低质量（不低于10）直到不超过上限，仍超出时记为失败")
+        parser.add_argument("--shrink-to-fit", action="store_true", help="与 --max-bytes 一起使用：最低质量仍超出上限（或无损格式超出上限）时缩小图片尺寸")
+        parser.add_argument("--target", action="append", default=[], help="额外的输出目标，可多次指定，如 format=webp,quality=80,max-size=320x320,output=thumbs；每张图片只解码一次")
+        parser.add_argument("--keep-structure", action="store_true", help="递归处理时在输出目录中保留输入目录的子目录结构")
+        parser.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default="suffix", help="输出文件名冲突时的处理方式：suffix添加序号（默认）、skip跳过、error记为失败")
+        parser.add_argument("--count", action="store_true", help="转换前先统计图片数量，以便进度条显示总数和剩余时间")
+        parser.add_argument("--estimate", action="store_true", help="转换前读取每张图片的文件头，按像素总量显示进度和剩余时间（比 --count 更准确）")
+        parser.add_argument("--passthrough", choices=PASSTHROUGH_METHODS, help="输入已是目标格式且无需缩放时不重新编码，直接复制（copy）或硬链接（link）")
+        parser.add_argument("--incremental", action="store_true", help="增量转换：跳过输入文件和转换参数都未变化的图片")
+        parser.add_argument("--hash", action="store_true", help="增量转换时额外记录并比较文件内容摘要（SHA-256）")
+        parser.add_argument("--resume", action="store_true", help="继续上次被中断的批次：跳过批次日志中已经成功且输出完整的图片")
+        parser.add_argument("--watch", action="store_true", help="监视模式：转换已有图片后持续监视输入目录，新增或修改的图片写完后立即转换，按 Ctrl+C 停止")
+        parser.add_argument("--settle", type=float, default=2.0, help="监视模式下文件保持不变多少秒后才开始转换（避免转换未写完的文件），默认2")
+        parser.add_argument("--poll", action="store_true", help="监视模式下使用定时扫描代替文件事件（如网络文件系统）；未安装 watchdog 时总是定时扫描")
+        parser.add_argument("--jobs", help="任务文件（JSON Lines 或 CSV），每项指定 input、output 和可选的 format、quality 等参数，代替 -i 转换任意位置的图片")
+        parser.add_argument("--shard", type=shard_argument, help="只转换任务文件中属于该分片的任务，如 0/8 表示共8个分片中的第0个；按输入路径确定分配，可在多台机器上分别运行")
+        parser.add_argument("--results", help="结果文件路径（JSON Lines），默认在任务文件旁，如 jobs.results.0-of-8.jsonl；与 --merge 一起使用时为合并后的文件")
+        parser.add_argument("--merge", nargs="+", metavar="RESULTS", help="合并各分片的结果文件并汇总；同时指定 --jobs 时列出没有结果的任务")
+        parser.add_argument("--serve", metavar="SOCKET", help="转换服务模式：在此 Unix 套接字上常驻接受转换请求（客户端见 image_converter_client.py），避免每张图片重新启动")
+        parser.add_argument("--report", help="运行报告文件（JSON Lines）：每个输出完成后立即追加一行结果（输入、输出、状态、错误类型、字节数、耗时），最后一行为汇总")
+        parser.add_argument("--metrics", action="store_true", help="统计各阶段耗时，转换完成后打印性能摘要")
+        parser.add_argument("--metrics-jsonl", help="把每张图片的耗时和字节数逐行写入此JSON Lines文件（会同时启用 --metrics）")
+        parser.add_argument("--metrics-prom", help="把性能统计以 Prometheus 文本格式写入此文件（会同时启用 --metrics）")
+        parser.add_argument("--cache", help="转换结果缓存目录：内容相同的图片（包括多次运行之间）直接链接缓存的结果，不再重新编码")
+        parser.add_argument("--cache-size", type=bytes_argument, default=DEFAULT_CACHE_SIZE, help="缓存总大小上限，超出时删除最久未使用的结果，默认4G")
+        parser.add_argument("--memory-budget", type=bytes_argument, help="同时转换的图片估算内存总量上限，如 2G、512M；按文件头估算每张图片解码后的大小，超出时等待其他图片完成")
+        parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help=f"并行进程数，默认为CPU核心数（{DEFAULT_WORKERS}）")
         
         args = parser.parse_args()
         
+        if args.serve:
+            return serve_mode(args)
+        
+        # 分片结果合并与任务文件模式：输入由任务文件给出，不使用 -i
+        if args.merge:
+            return merge_mode(args)
+        if args.jobs:
+            if args.input or args.target or args.incremental or args.watch:
+                print("错误：任务文件模式不能使用 -i、--target、--incremental 和 --watch")
+                return 2
+            return job_mode(args)
+        if not args.input:
+            parser.error("请指定输入目录（-i）或任务文件（--jobs）")
+        
+        # 压缩包和流模式：输入或输出是压缩包、标准输入或标准输出，不经过临时文件
+        if args.input == "-" or args.output == "-" or os.path.isfile(args.input) or archive_format_from_path(args.output):
+            log = sys.stderr if args.output == "-" else sys.stdout
+            if args.target or args.incremental or args.cache or args.watch:
+                print("错误：压缩包和流模式只支持一个输出目标，不能使用 --target、--incremental、--cache 和 --watch", file=log)
+                return 2
+            # 输出到图片文件时可以省略 -f，按扩展名确定格式
+            extension = os.path.splitext(args.output)[1][1:].lower()
+            if not args.format and extension in SUPPORTED_FORMATS:
+                args.format = extension
+            options = ConvertOptions(args.format, args.quality, None, args.max_size, args.scale, args.profile,
+                                     args.passthrough, workers=args.workers, memory_budget=args.memory_budget,
+                                     background=args.background, max_bytes=args.max_bytes, shrink_to_fit=args.shrink_to_fit)
+            try:
+                options.validate()
+            except ValueError as e:
+                print(f"错误：{e}", file=log)
+                return 2
+            return archive_mode(args, options)
+        
         # 验证输入目录是否存在
         if not os.path.isdir(args.input):
             print(f"错误：输入目录 '{args.input}' 不存在")
-            return
+            return 2
         
-        # 验证输出质量参数
-        if args.quality < 0 or args.quality > 100:
-            print(f"错误：输出质量必须在0-100之间，当前值为 {args.quality}")
-            return
+        # 汇总输出目标：-f 及相关参数构成第一个目标，--target 追加更多目标
+        targets = []
+        for spec in args.target:
+            try:
+                targets.append(parse_target(spec, {"quality": args.quality, "output_dir": args.output, "profile": args.profile,
+                                                   "passthrough": args.passthrough, "background": args.background,
+                                                   "max_bytes": args.max_bytes, "shrink_to_fit": args.shrink_to_fit}))
+            except ValueError as e:
+                print(f"错误：{e}")
+                return 2
         
-        # 获取所有图片文件
-        print(f"正在扫描图片文件...")
-        image_files = get_image_files(args.input, args.recursive)
+        options = ConvertOptions(
+            args.format, args.quality, args.output, args.max_size, args.scale, args.profile, args.passthrough,
+            targets=targets, input_dir=args.input, keep_structure=args.keep_structure,
+            on_conflict=args.on_conflict, workers=args.workers, memory_budget=args.memory_budget,
+            cache=ConversionCache(args.cache, args.cache_size) if args.cache else None, background=args.background,
+            max_bytes=args.max_bytes, shrink_to_fit=args.shrink_to_fit,
+        )
         
-        if not image_files:
-            print(f"未找到图片文件")
-            return
+        # 验证转换参数
+        try:
+            options.validate()
+        except ValueError as e:
+            print(f"错误：{e}")
+            return 2
+        
+        if args.watch:
+            return watch_mode(args, options)
         
-        print(f"找到 {len(image_files)} 张图片")
+        # 可选：预先统计图片数量（或像素总量），用于显示进度条总数
+        total = None
+        pixel_counts = None
+        if args.estimate:
+            print(f"正在读取图片信息...")
+            pixel_counts = estimate_pixels(iter_image_files(args.input, args.recursive), args.workers)
+            if not pixel_counts:
+                print(f"未找到图片文件")
+                return 0
+            total = sum(pixel_counts.values())
+            print(f"找到 {len(pixel_counts)} 张图片，共 {total / 1e6:.1f} 百万像素")
+        elif args.count:
+            print(f"正在统计图片数量...")
+            total = count_image_files(args.input, args.recursive)
+            if not total:
+                print(f"未找到图片文件")
+                return 0
+            print(f"找到 {total} 张图片")
         
-        # 开始转换
-        print(f"开始转换为 {args.format.upper()} 格式...")
+        params = options.manifest_params()
+        manifest = None
+        if args.incremental:
+            manifest = Manifest(args.output, use_hash=args.hash)
         
-        success_count = 0
-        fail_count = 0
-        fail_list = []
+        # 批次日志：每张图片完成后立即记录，中断后可以用 --resume 继续
+        try:
+            journal = Journal(args.output, params, resume=args.resume)
+        except ValueError as e:
+            print(f"错误：{e}")
+            return 2
+        if args.resume and not journal.resumed:
+            print(f"没有找到可以继续的批次，重新开始转换")
         
-        # 使用tqdm显示进度
-        for img_path in tqdm(image_files, desc="转换进度"):
-            success, input_path, output_path, error = convert_image(
-                img_path, args.output, args.format, args.quality
-            )
-            
-            if success:
-                success_count += 1
-            else:
-                fail_count += 1
-                fail_list.append((input_path, error))
+        # 开始转换（边扫描边转换）
+        print(f"开始转换为 {'、'.join(target['format'].upper() for target in options.targets)} 格式...")
+        
+        found_count = 0
+        skipped_count = 0
+        
+        # 使用tqdm显示进度（--estimate 时以像素为单位）
+        if pixel_counts is not None:
+            progress = progress_bar(total=total, desc="转换进度", unit="px", unit_scale=True)
+        else:
+            progress = progress_bar(total=total, desc="转换进度")
+        
+        def advance(img_path):
+            progress.update(pixel_counts.pop(img_path, 0) if pixel_counts is not None else 1)
+        
+        def skip(img_path):
+            nonlocal skipped_count
+            skipped_count += 1
+            advance(img_path)
+        
+        def scan():
+            nonlocal found_count
+            for img_path in iter_image_files(args.input, args.recursive):
+                found_count += 1
+                yield img_path
+        
+        def should_convert(img_path, output_paths):
+            # 继续中断的批次：跳过已经完成的图片
+            if journal.is_done(img_path):
+                return False
+            # 增量转换：跳过未变化的图片
+            if manifest and not manifest.needs_conversion(img_path, params, output_paths):
+                return False
+            return True
+        
+        metrics = None
+        if args.metrics or args.metrics_jsonl or args.metrics_prom:
+            metrics = ConversionMetrics(args.metrics_jsonl)
+        report = RunReport(args.report)
+        
+        finished = False
+        try:
+            for results in convert_batch(scan(), options, metrics, should_convert=should_convert, on_skip=skip, report=report):
+                journal.record(results)
+                advance(results[0][1])
+                # 所有目标都成功才记入清单
+                if manifest and all(result[0] for result in results):
+                    manifest.record(results[0][1], [result[2] for result in results])
+            finished = True
+        finally:
+            progress.close()
+            # 正常结束时删除日志，中断时保留以便继续
+            journal.close(finished)
+            if metrics:
+                metrics.close()
+            report.close()
+            # 中断时也保存已完成的部分
+            if manifest:
+                manifest.save()
+            # 缓存超出大小上限时淘汰最久未使用的结果
+            if options.cache:
+                options.cache.evict()
+        
+        if not found_count:
+            print(f"未找到图片文件")
+            return 0
         
         # 输出转换结果
         print("\n转换完成！")
-        print(f"成功：{success_count} 张")
-        print(f"失败：{fail_count} 张")
+        print(f"成功：{report.success_count} 张")
+        print(f"失败：{report.fail_count} 张")
+        if manifest:
+            print(f"跳过：{manifest.skipped} 张")
+        if journal.resumed:
+            print(f"中断前已完成：{journal.skipped} 张")
+        conflict_skipped = skipped_count - journal.skipped - (manifest.skipped if manifest else 0)
+        if conflict_skipped:
+            print(f"因文件名冲突跳过：{conflict_skipped} 张")
+        
+        report.print_failures()
         
-        if fail_list:
-            print("\n失败列表：")
-            for img_path, error in fail_list:
-                print(f"  {img_path}: {error}")
+        if metrics:
+            metrics.print_summary()
+            if args.metrics_prom:
+                metrics.write_prometheus(args.metrics_prom)
         
         print(f"\n输出目录：{os.path.abspath(args.output)}")
+        if args.report:
+            print(f"报告文件：{os.path.abspath(args.report)}")
+        return 1 if report.fail_count else 0
     else:
         # 交互式模式
         interactive_mode()
+        return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
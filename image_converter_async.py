@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量图片格式转换器 - 异步接口
+供 aiohttp、FastAPI 等异步Web服务调用，转换在进程池中执行，不阻塞事件循环：
+
+    from image_converter_async import AsyncConverter
+
+    converter = AsyncConverter(max_concurrency=8)
+
+    async def handle_upload(request):
+        data = await request.read()
+        webp = await converter.convert(data, "webp", quality=80, max_size=(1600, 1600))
+        ...
+
+    # 服务关闭时
+    await converter.close()
+"""
+
+import os
+import asyncio
+import inspect
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+from image_converter_core import DEFAULT_WORKERS, DEFAULT_PROFILE, ConvertOptions, convert_source
+
+class AsyncConverter:
+    """
+    异步图片转换器
+
+    CPU密集的解码和编码在执行器中完成（默认为 workers 个进程的进程池），
+    同时进行的转换数量受 max_concurrency 限制，超出的请求在 await 处排队等待，
+    不会无限占用内存。取消正在 await 的任务时，尚未开始的转换会从执行器中撤销，
+    已经开始的转换在后台完成，结果被丢弃。
+    """
+
+    def __init__(self, executor=None, max_concurrency=None, workers=DEFAULT_WORKERS):
+        """
+        Args:
+            executor: concurrent.futures 执行器；为None时在首次转换时创建进程池，
+                传入的执行器由调用方负责关闭
+            max_concurrency: 最多同时进行的转换数，默认为 workers 的2倍
+            workers: 默认进程池的进程数
+        """
+        self._executor = executor
+        self._owns_executor = executor is None
+        self.workers = workers
+        self.max_concurrency = max_concurrency or workers * 2
+        self._semaphore = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _read_source(self, source):
+        """
+        把文件对象读取为bytes，支持 read() 为协程的异步文件对象（如 UploadFile）
+        """
+        if isinstance(source, (bytes, str, os.PathLike)):
+            return source
+        if isinstance(source, (bytearray, memoryview)):
+            # memoryview 无法传给子进程
+            return bytes(source)
+        data = source.read()
+        if inspect.isawaitable(data):
+            data = await data
+        return data
+
+    async def convert(self, source, target_format, quality=85, output_path=None, max_size=None, scale=None,
+                      profile=DEFAULT_PROFILE, timeout=None):
+        """
+        转换一张图片
+
+        Args:
+            source: 输入图片，可以是bytes、文件对象（同步或异步 read()）或文件路径
+            target_format: 目标格式（如jpg、png等）
+            quality: 输出图片质量（0-100）
+            output_path: 输出文件路径；为None时返回转换后的数据
+            max_size: 最大尺寸 (宽, 高)，按比例缩小到不超过该尺寸
+            scale: 缩放比例
+            profile: 编码配置（见 ENCODE_PROFILES）
+            timeout: 超时时间（秒），超时抛出 asyncio.TimeoutError
+
+        Returns:
+            bytes 或 str: 转换后的数据，或输出文件路径
+
+        Raises:
+            ValueError: 参数无效时
+            图片无法识别或转换失败时抛出转换过程中的异常
+        """
+        options = ConvertOptions(target_format, quality, None, max_size, scale, profile)
+        options.validate()
+        target = options.targets[0]
+
+        # 信号量需要在事件循环中创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            data = await self._read_source(source)
+            loop = asyncio.get_running_loop()
+            job = functools.partial(convert_source, data, target, output_path)
+            return await asyncio.wait_for(loop.run_in_executor(self._get_executor(), job), timeout)
+
+    async def close(self):
+        """
+        关闭自动创建的进程池（等待进行中的转换完成）
+        """
+        if self._owns_executor and self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+_default_converter = None
+
+async def convert_async(source, target_format, quality=85, output_path=None, max_size=None, scale=None,
+                        profile=DEFAULT_PROFILE, timeout=None):
+    """
+    使用模块级的默认转换器转换一张图片，参数见 AsyncConverter.convert
+    """
+    global _default_converter
+    if _default_converter is None:
+        _default_converter = AsyncConverter()
+    return await _default_converter.convert(source, target_format, quality, output_path, max_size, scale, profile, timeout)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量图片格式转换器 - 转换服务客户端
+把一张图片交给常驻的转换服务（python image_converter.py --serve 套接字路径）转换，
+适合上传钩子等每张图片启动一次的场景：
+
+    python image_converter_client.py -s /run/imgconv.sock -i upload.png -o upload.webp -q 80
+    python image_converter_client.py -s /run/imgconv.sock -i - -o - -f jpg < a.png > a.jpg
+
+启动时只导入标准库中的 socket 和 json，不导入Pillow；服务没有运行时退回在本进程中转换。
+转换成功时退出码为0，失败时为1。
+"""
+
+import os
+import sys
+import json
+import socket
+
+USAGE = """用法：image_converter_client.py -s 套接字 -i 输入 [-o 输出] [-f 格式] [-q 质量] [-p 编码配置]
+                                [--max-size 宽x高] [--scale 比例] [--background 颜色] [--max-bytes 大小]
+输入、输出为 - 时使用标准输入、标准输出"""
+
+# 命令行参数与请求字段的对应关系
+# （不使用 argparse：它的导入时间与一次小图片转换的耗时相当）
+OPTIONS = {
+    "-s": "socket", "--socket": "socket",
+    "-i": "input", "--input": "input",
+    "-o": "output", "--output": "output",
+    "-f": "format", "--format": "format",
+    "-q": "quality", "--quality": "quality",
+    "-p": "profile", "--profile": "profile",
+    "--max-size": "max_size",
+    "--scale": "scale",
+    "--background": "background",
+    "--max-bytes": "max_bytes",
+}
+
+def request(socket_path, fields, data=None, timeout=None):
+    """
+    向转换服务发送一个请求
+
+    Args:
+        socket_path: 服务的 Unix 套接字路径
+        fields: 请求字段（见 image_converter_server）
+        data: input 为 "-" 时的图片数据
+        timeout: 超时时间（秒）
+
+    Returns:
+        tuple: (回复字典, output 为 "-" 时的转换结果数据，否则为None)
+
+    Raises:
+        OSError: 无法连接服务或连接中断时
+    """
+    fields = dict(fields)
+    if data is not None:
+        fields["length"] = len(data)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(fields, ensure_ascii=False).encode("utf-8") + b"\n" + (data or b""))
+        with sock.makefile("rb") as f:
+            line = f.readline()
+            if not line:
+                raise ConnectionError("转换服务没有回复")
+            reply = json.loads(line)
+            payload = f.read(reply["length"]) if "length" in reply else None
+    return reply, payload
+
+def convert_locally(fields, data):
+    """
+    服务没有运行时在本进程中转换（此时才导入转换核心）
+    """
+    from image_converter_core import convert_source
+    from image_converter_jobs import parse_job
+
+    input_path, output_path, target = parse_job(fields, {"output_dir": "output"}, "参数")
+    source = data if input_path == "-" else input_path
+    result = convert_source(source, target, None if output_path == "-" else output_path)
+    if output_path == "-":
+        return {"ok": True, "length": len(result)}, result
+    return {"ok": True, "output": result}, None
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE)
+        return 0
+
+    fields = {}
+    for option, value in zip(argv[::2], argv[1::2]):
+        if option not in OPTIONS:
+            print(f"错误：未知的参数 '{option}'\n{USAGE}", file=sys.stderr)
+            return 2
+        fields[OPTIONS[option]] = value
+    if len(argv) % 2 or "socket" not in fields or "input" not in fields:
+        print(f"错误：需要指定 -s 和 -i，且每个参数后都要有值\n{USAGE}", file=sys.stderr)
+        return 2
+
+    socket_path = fields.pop("socket")
+    # 路径由服务进程解析，转换为绝对路径
+    for key in ("input", "output"):
+        if key in fields and fields[key] != "-":
+            fields[key] = os.path.abspath(fields[key])
+    data = sys.stdin.buffer.read() if fields["input"] == "-" else None
+
+    try:
+        try:
+            reply, payload = request(socket_path, fields, data)
+        except (FileNotFoundError, ConnectionRefusedError):
+            reply, payload = convert_locally(fields, data)
+    except Exception as e:
+        reply, payload = {"ok": False, "error": str(e)}, None
+
+    if not reply.get("ok"):
+        print(f"错误：{reply.get('error')}", file=sys.stderr)
+        return 1
+    if payload is not None:
+        sys.stdout.buffer.write(payload)
+        sys.stdout.buffer.flush()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
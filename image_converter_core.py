@@ -0,0 +1,2619 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量图片格式转换器 - 转换核心
+命令行、交互式模式和GUI共用的转换引擎，也可以直接在其他程序中导入使用：
+
+    from image_converter_core import ConvertOptions, convert_batch, iter_image_files
+
+    options = ConvertOptions(target_format="webp", quality=80, output_dir="out")
+    for results in convert_batch(iter_image_files("photos"), options):
+        for success, input_path, output_path, error in results:
+            ...
+"""
+
+import os
+import io
+import json
+import time
+import heapq
+import signal
+import shutil
+import mmap
+import struct
+import threading
+import contextlib
+from collections import Counter, deque
+
+# 默认并行进程数（CPU核心数）
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# 支持的图片扩展名（小写）
+IMAGE_EXTENSIONS = frozenset([".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif", ".webp", ".ico"])
+
+# 支持的目标格式
+SUPPORTED_FORMATS = ["jpg", "jpeg", "png", "bmp", "gif", "tiff", "tif", "webp", "ico"]
+
+# 目标格式与Pillow格式名不同的映射
+FORMAT_ALIASES = {"jpg": "JPEG", "jpeg": "JPEG", "tif": "TIFF", "tiff": "TIFF"}
+
+# 使用质量参数的格式
+QUALITY_FORMATS = ["JPEG", "WEBP"]
+
+# 各格式的编码器可以直接保存的颜色模式，这些模式的图片不做任何转换
+# （如调色板图片输出为PNG时不再展开为RGB；GIF编码器自行把RGB量化为调色板）
+FORMAT_MODES = {
+    "JPEG": {"1", "L", "RGB", "CMYK"},
+    "PNG": {"1", "L", "LA", "P", "I;16", "RGB", "RGBA"},
+    "GIF": {"1", "L", "P", "RGB", "RGBA"},
+    "BMP": {"1", "L", "P", "RGB"},
+    "TIFF": {"1", "L", "LA", "P", "PA", "I", "I;16", "F", "RGB", "RGBA", "CMYK"},
+    "WEBP": {"RGB", "RGBA"},
+    "ICO": {"1", "L", "LA", "P", "RGB", "RGBA"},
+}
+
+# 带透明通道的颜色模式（La、RGBa 为预乘透明度）
+ALPHA_MODES = {"LA", "La", "PA", "RGBA", "RGBa"}
+
+# 可以直接保存透明色（调色板、灰度、RGB图片 info 中的 transparency）的格式；
+# 其他格式会丢弃透明色，需要先转换为带透明通道的模式
+TRANSPARENCY_KEY_FORMATS = {"PNG", "GIF"}
+
+# 灰度颜色模式，去掉透明通道或降低位深时保持灰度
+GRAY_MODES = {"1", "L", "LA", "La", "I", "I;16", "I;16B", "I;16L", "I;16N", "F"}
+
+# 目标格式不支持透明时，透明部分合成到的默认背景色
+DEFAULT_BACKGROUND = "#ffffff"
+
+# 限制输出大小（max_bytes）时搜索的最低质量
+MIN_FIT_QUALITY = 10
+
+# 限制输出大小时最多缩小尺寸的次数（需要允许缩小，见 make_target 的 shrink_to_fit）
+MAX_FIT_SHRINKS = 5
+
+# 可以保存多帧（动画或多页）的格式，其他格式只保存第一帧
+ANIMATED_FORMATS = ["GIF", "WEBP", "TIFF"]
+
+# 编码配置：各格式在速度与文件大小之间的取舍
+#   fast：不做额外的优化扫描，适合大批量导入
+#   balanced：默认配置，与此前版本的输出相同
+#   smallest：使用最慢但压缩率最高的设置
+ENCODE_PROFILES = {
+    "fast": {
+        "JPEG": {"optimize": False, "progressive": False, "subsampling": 2},
+        "PNG": {"compress_level": 1},
+        "WEBP": {"method": 0},
+        "GIF": {"optimize": False},
+    },
+    "balanced": {
+        "JPEG": {"optimize": True, "subsampling": 0},
+        "PNG": {"optimize": True},
+    },
+    "smallest": {
+        "JPEG": {"optimize": True, "progressive": True, "subsampling": 2},
+        "PNG": {"optimize": True, "compress_level": 9},
+        "WEBP": {"method": 6},
+        "TIFF": {"compression": "tiff_adobe_deflate"},
+        "GIF": {"optimize": True},
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# 已是目标格式时的处理方式：copy复制、link硬链接
+PASSTHROUGH_METHODS = ["copy", "link"]
+
+# JPEG 中没有长度字段的标记：TEM、SOI、EOI
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8, 0xD9}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 输出文件名冲突处理策略
+CONFLICT_POLICIES = ["suffix", "skip", "error"]
+
+# 增量转换清单文件名（保存在输出目录中）
+MANIFEST_NAME = ".convert_manifest.json"
+MANIFEST_VERSION = 2
+
+# 转换结果缓存的版本，缓存键的计算方式或输出内容变化时递增，旧缓存自然失效
+CACHE_VERSION = 3
+
+# 转换结果缓存的默认大小上限
+DEFAULT_CACHE_SIZE = 4 * 1024 ** 3
+
+# 批次日志文件名（保存在输出目录中，用于中断后 --resume 继续）
+JOURNAL_NAME = ".convert_journal.jsonl"
+JOURNAL_VERSION = 1
+
+# 运行报告在内存中保留的失败项数（用于打印和图形界面显示），完整的记录只写入报告文件
+MAX_KEPT_FAILURES = 20
+
+def pillow_format(target_format):
+    """
+    目标格式（扩展名）对应的Pillow格式名
+    
+    Args:
+        target_format: 目标格式（如jpg、tif等）
+        
+    Returns:
+        str: Pillow格式名（如JPEG、TIFF等）
+    """
+    return FORMAT_ALIASES.get(target_format.lower(), target_format.upper())
+
+def build_save_params(target_format, quality=85, profile=DEFAULT_PROFILE):
+    """
+    生成保存图片时传给Pillow的参数
+    
+    Args:
+        target_format: 目标格式（如jpg、png等）
+        quality: 输出图片质量（0-100），只对JPEG和WebP有效
+        profile: 编码配置（见 ENCODE_PROFILES）
+        
+    Returns:
+        dict: img.save 的关键字参数
+    """
+    format_name = pillow_format(target_format)
+    save_params = {"format": format_name}
+    
+    # 只有有损格式使用质量参数
+    if format_name in QUALITY_FORMATS:
+        save_params["quality"] = quality
+    
+    # 针对不同格式的特殊处理
+    save_params.update(ENCODE_PROFILES[profile].get(format_name, {}))
+    
+    return save_params
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    计算文件内容的SHA-256摘要
+    
+    Args:
+        path: 文件路径
+        chunk_size: 每次读取的字节数
+        
+    Returns:
+        str: 十六进制摘要
+    """
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Manifest:
+    """
+    增量转换清单
+    
+    记录每个输入文件的大小、修改时间（可选内容摘要）以及转换参数，
+    再次运行时跳过输入和参数都未变化、且输出文件仍存在的图片。
+    """
+    
+    def __init__(self, output_dir, use_hash=False):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.use_hash = use_hash
+        self.entries = {}
+        self.pending = {}
+        self.skipped = 0
+        
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                # 旧版本的清单格式不同，视为没有清单
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                # 清单损坏时视为没有清单，全部重新转换
+                self.entries = {}
+    
+    def needs_conversion(self, img_path, params, output_paths=None):
+        """
+        判断图片是否需要转换
+        
+        Args:
+            img_path: 输入图片路径
+            params: 转换参数（可JSON序列化）
+            output_paths: 本次规划的输出路径列表（为None的项不输出），
+                与清单记录不同时需要重新转换
+            
+        Returns:
+            bool: 需要转换时为True；文件已被删除或无法读取时也为True，
+                由转换任务把它记为该图片的失败，而不是中断整个批次
+        """
+        key = os.path.abspath(img_path)
+        # 经过一次JSON往返，保证与从清单读出的参数可以直接比较
+        params = json.loads(json.dumps(params))
+        try:
+            stat = os.stat(img_path)
+        except OSError:
+            # 扫描到之后被删除或改名（监视模式下常见）
+            return True
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        
+        entry = self.entries.get(key)
+        if entry and output_paths is not None:
+            planned = [os.path.abspath(path) for path in output_paths if path is not None]
+            if entry.get("outputs") != planned:
+                entry = None
+        if entry and entry.get("params") == params and entry.get("outputs") and all(os.path.exists(path) for path in entry["outputs"]):
+            if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+                self.skipped += 1
+                return False
+            # 仅修改时间变化（如被touch或重新同步）时，用内容摘要确认
+            if self.use_hash and entry.get("sha256") and entry.get("size") == stat.st_size:
+                try:
+                    fingerprint["sha256"] = file_digest(img_path)
+                except OSError:
+                    return True
+                if fingerprint["sha256"] == entry["sha256"]:
+                    entry.update(fingerprint)
+                    self.skipped += 1
+                    return False
+        
+        self.pending[key] = (fingerprint, params)
+        return True
+    
+    def record(self, img_path, output_paths):
+        """
+        记录转换成功的图片
+        
+        Args:
+            img_path: 输入图片路径
+            output_paths: 输出图片路径列表
+        """
+        key = os.path.abspath(img_path)
+        if key not in self.pending:
+            return
+        fingerprint, params = self.pending.pop(key)
+        if self.use_hash and "sha256" not in fingerprint:
+            try:
+                fingerprint["sha256"] = file_digest(img_path)
+            except OSError:
+                # 转换后输入已被删除：不记录，下次遇到时重新转换
+                return
+        self.entries[key] = dict(fingerprint, params=params, outputs=[os.path.abspath(path) for path in output_paths])
+    
+    def save(self):
+        """
+        保存清单（先写临时文件再替换，避免中断时损坏清单）
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = json.dumps({"version": MANIFEST_VERSION, "entries": self.entries}, ensure_ascii=False)
+        write_atomic(self.path, data.encode("utf-8"))
+
+class OutputPlanner:
+    """
+    输出路径规划
+    
+    在主进程中为每张图片预先确定输出路径：可选保留输入目录结构，
+    并按固定策略处理同一批次内的输出文件名冲突（如 a/x.png 与 b/x.png、
+    test_0.png 与 test_0.jpg）。输出目录在这里按目录创建一次，
+    转换进程不再各自调用 os.makedirs，并行转换时也不会互相覆盖。
+    每个输出目标使用一个规划器。
+    """
+    
+    def __init__(self, input_dir, output_dir, target_format, keep_structure=False, on_conflict="suffix", claimed=None):
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突处理策略 '{on_conflict}'")
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.extension = target_format.lower()
+        self.keep_structure = keep_structure
+        self.on_conflict = on_conflict
+        # 多个输出目标的规划器共用同一个集合，避免不同目标输出到同一路径
+        self.claimed = claimed if claimed is not None else set()
+        self.created_dirs = set()
+        self.skipped = 0
+    
+    def plan(self, img_path):
+        """
+        规划一张图片的输出路径
+        
+        Args:
+            img_path: 输入图片路径
+            
+        Returns:
+            str: 输出路径；冲突策略为skip且发生冲突时返回None
+            
+        Raises:
+            FileExistsError: 冲突策略为error且发生冲突时
+        """
+        target_dir = self.output_dir
+        if self.keep_structure:
+            relative_dir = os.path.relpath(os.path.dirname(img_path), self.input_dir)
+            if relative_dir != os.curdir:
+                target_dir = os.path.join(self.output_dir, relative_dir)
+        
+        filename = os.path.splitext(os.path.basename(img_path))[0]
+        output_path = os.path.join(target_dir, f"{filename}.{self.extension}")
+        
+        if self._key(output_path) in self.claimed:
+            if self.on_conflict == "skip":
+                self.skipped += 1
+                return None
+            if self.on_conflict == "error":
+                raise FileExistsError(f"输出文件名冲突：{output_path}")
+            if self.on_conflict == "suffix":
+                # 后缀取自输入文件的扩展名（x.png -> x_png.webp），不按出现顺序编号：
+                # 同一目录内 x.jpg、x.png、x.gif 冲突时，带后缀的名称不随扫描顺序变化
+                # （哪一个保留不带后缀的名称仍取决于扫描顺序，见 iter_image_files）
+                source_extension = os.path.splitext(img_path)[1].lstrip(".").lower()
+                stem = f"{filename}_{source_extension}" if source_extension else filename
+                output_path = os.path.join(target_dir, f"{stem}.{self.extension}")
+                index = 1
+                while self._key(output_path) in self.claimed:
+                    # 仍然冲突（不同目录中的同名文件）时再添加序号
+                    output_path = os.path.join(target_dir, f"{stem}_{index}.{self.extension}")
+                    index += 1
+        
+        self.claimed.add(self._key(output_path))
+        if target_dir not in self.created_dirs:
+            os.makedirs(target_dir, exist_ok=True)
+            self.created_dirs.add(target_dir)
+        return output_path
+    
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+class Journal:
+    """
+    批次日志
+    
+    每张图片处理完成后向日志追加一行JSON（输入路径、是否成功、输出文件及其大小），
+    并立即写入文件，进程被杀死时最多丢失正在写的最后一行。
+    中断后以 resume=True 打开，跳过已经成功且输出文件仍完整（大小与记录一致）的图片；
+    失败的图片和没有记录的图片重新转换。批次正常结束后日志被删除。
+    """
+    
+    def __init__(self, output_dir, params, resume=False):
+        """
+        Args:
+            output_dir: 输出目录，日志保存在其中
+            params: 转换参数（可JSON序列化），继续的批次必须使用相同的参数
+            resume: 为True时读取已有日志并继续追加，否则重新开始
+            
+        Raises:
+            ValueError: 继续的批次转换参数不同时
+        """
+        self.path = os.path.join(output_dir, JOURNAL_NAME)
+        # 经过一次JSON往返，保证与从日志读出的参数可以直接比较
+        self.params = json.loads(json.dumps(params))
+        self.completed = {}
+        self.resumed = False
+        self.skipped = 0
+        
+        if resume:
+            self._load()
+        
+        os.makedirs(output_dir, exist_ok=True)
+        self.file = open(self.path, "a" if self.resumed else "w", encoding="utf-8")
+        if not self.resumed:
+            self._write({"version": JOURNAL_VERSION, "params": self.params})
+    
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get("version") != JOURNAL_VERSION:
+            # 日志损坏或版本不同时视为没有可继续的批次
+            return
+        if header.get("params") != self.params:
+            raise ValueError("转换参数与中断的批次不同，无法继续；请使用相同的参数，或去掉 --resume 重新开始")
+        
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 被中断时写了一半的最后一行
+                continue
+            if entry.get("ok"):
+                self.completed[entry["input"]] = entry["outputs"]
+            else:
+                self.completed.pop(entry["input"], None)
+        self.resumed = True
+    
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+    
+    def is_done(self, img_path):
+        """
+        判断图片在中断的批次中是否已经成功转换
+        
+        只相信大小与日志记录一致的输出文件，输出被删除或不完整时重新转换。
+        """
+        outputs = self.completed.get(os.path.abspath(img_path))
+        if not outputs:
+            return False
+        for path, size in outputs:
+            try:
+                if os.path.getsize(path) != size:
+                    return False
+            except OSError:
+                return False
+        self.skipped += 1
+        return True
+    
+    def record(self, results):
+        """
+        记录一张图片的转换结果
+        
+        Args:
+            results: 该图片各输出目标的 (是否成功, 输入路径, 输出路径, 错误信息)
+        """
+        entry = {
+            "input": os.path.abspath(results[0][1]),
+            "ok": all(result[0] for result in results),
+            "outputs": [[os.path.abspath(path), os.path.getsize(path)] for success, _, path, _ in results if success],
+        }
+        errors = [error for success, _, _, error in results if not success]
+        if errors:
+            entry["errors"] = errors
+        self._write(entry)
+    
+    def close(self, finished=False):
+        """
+        关闭日志
+        
+        Args:
+            finished: 批次正常结束时为True，删除日志
+        """
+        self.file.close()
+        if finished:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+# 性能统计中的各阶段
+METRIC_STAGES = ["open", "decode", "convert", "encode", "write", "total"]
+
+# 性能统计中计算 p50/p95 保留的样本数（蓄水池抽样），内存占用与图片数量无关
+METRIC_SAMPLES = 10000
+
+def percentile(sorted_values, fraction):
+    """
+    计算已排序数据的百分位数（最近秩法）
+    
+    Args:
+        sorted_values: 已排序的数值列表
+        fraction: 百分位（0-1），如 0.95
+        
+    Returns:
+        float: 百分位数，数据为空时返回0
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class ConversionMetrics:
+    """
+    转换性能统计
+    
+    汇总每张图片的打开、解码、模式转换、编码、写入耗时和输入输出字节数，
+    给出各阶段的 p50/p95/最大值、吞吐量和最慢的文件，用于判断批次是
+    受I/O限制还是受编码限制。可选把每张图片的记录逐行写入JSON Lines文件。
+    
+    总和、最大值精确统计；p50/p95 由最多 samples 张图片的均匀抽样
+    （蓄水池抽样）计算，长时间运行的监视模式下内存占用不会持续增长。
+    """
+    
+    def __init__(self, jsonl_path=None, slowest=10, samples=METRIC_SAMPLES):
+        import random
+        self.started = time.perf_counter()
+        self.finished = None
+        self.count = 0
+        self.fail_count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.passthrough = 0
+        self.cache_hits = 0
+        self.stage_sums = dict.fromkeys(METRIC_STAGES, 0.0)
+        self.stage_max = dict.fromkeys(METRIC_STAGES, 0.0)
+        # 每个样本是一张图片各阶段的耗时（按 METRIC_STAGES 的顺序）
+        self.samples = []
+        self.sample_limit = samples
+        self.random = random.Random()
+        self.slowest_limit = slowest
+        self.slowest = []
+        self.jsonl_file = open(jsonl_path, "w", encoding="utf-8") if jsonl_path else None
+    
+    def add(self, stats, success):
+        """
+        记录一张图片的统计信息
+        
+        Args:
+            stats: convert_targets 填写的统计字典
+            success: 是否全部目标都转换成功
+        """
+        self.count += 1
+        if not success:
+            self.fail_count += 1
+        self.bytes_in += stats["bytes_in"]
+        self.bytes_out += stats["bytes_out"]
+        self.passthrough += stats.get("passthrough", 0)
+        self.cache_hits += stats.get("cache_hits", 0)
+        values = tuple(stats[stage] for stage in METRIC_STAGES)
+        for stage, value in zip(METRIC_STAGES, values):
+            self.stage_sums[stage] += value
+            if value > self.stage_max[stage]:
+                self.stage_max[stage] = value
+        
+        # 蓄水池抽样：第 n 张图片以 limit/n 的概率替换一个已有样本
+        if len(self.samples) < self.sample_limit:
+            self.samples.append(values)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.sample_limit:
+                self.samples[index] = values
+        
+        # 用小顶堆只保留最慢的若干张
+        item = (stats["total"], stats["input"])
+        if len(self.slowest) < self.slowest_limit:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+        
+        if self.jsonl_file:
+            record = dict(stats, success=success)
+            self.jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def close(self):
+        """
+        结束统计并关闭JSON Lines文件
+        """
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        if self.jsonl_file:
+            self.jsonl_file.close()
+            self.jsonl_file = None
+    
+    def summary(self):
+        """
+        汇总统计结果
+        
+        Returns:
+            dict: 汇总信息
+        """
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        stages = {}
+        for column, stage in enumerate(METRIC_STAGES):
+            ordered = sorted(sample[column] for sample in self.samples)
+            stages[stage] = {
+                "sum": self.stage_sums[stage],
+                "p50": percentile(ordered, 0.5),
+                "p95": percentile(ordered, 0.95),
+                "max": self.stage_max[stage],
+            }
+        return {
+            "files": self.count,
+            "failed": self.fail_count,
+            "elapsed": elapsed,
+            "files_per_sec": self.count / elapsed if elapsed else 0.0,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "passthrough": self.passthrough,
+            "cache_hits": self.cache_hits,
+            "mb_in_per_sec": self.bytes_in / elapsed / 1e6 if elapsed else 0.0,
+            "stages": stages,
+            "slowest": [{"input": path, "total": total} for total, path in sorted(self.slowest, reverse=True)],
+        }
+    
+    def print_summary(self):
+        """
+        打印统计摘要
+        """
+        summary = self.summary()
+        print("\n性能统计：")
+        print(f"  图片数：{summary['files']} 张，耗时 {summary['elapsed']:.2f} 秒，"
+              f"{summary['files_per_sec']:.1f} 张/秒，输入 {summary['mb_in_per_sec']:.1f} MB/秒")
+        print(f"  输入 {summary['bytes_in'] / 1e6:.1f} MB，输出 {summary['bytes_out'] / 1e6:.1f} MB，直接复制 {summary['passthrough']} 个，缓存命中 {summary['cache_hits']} 个")
+        
+        # 各阶段时间占比（不含total），用于判断瓶颈
+        busy = sum(summary["stages"][stage]["sum"] for stage in METRIC_STAGES if stage != "total") or 1.0
+        print(f"  {'阶段':<8}{'占比':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'最大(ms)':>10}")
+        for stage in METRIC_STAGES:
+            values = summary["stages"][stage]
+            share = "" if stage == "total" else f"{values['sum'] / busy:.0%}"
+            print(f"  {stage:<8}{share:>8}{values['p50'] * 1000:>10.1f}{values['p95'] * 1000:>10.1f}{values['max'] * 1000:>10.1f}")
+        
+        if summary["slowest"]:
+            print("  最慢的图片：")
+            for item in summary["slowest"]:
+                print(f"    {item['total'] * 1000:.1f} ms  {item['input']}")
+    
+    def write_prometheus(self, path):
+        """
+        以 Prometheus 文本格式写出统计结果（可供 node_exporter 的 textfile 采集）
+        
+        Args:
+            path: 输出文件路径
+        """
+        summary = self.summary()
+        lines = [
+            "# HELP image_converter_files_total Converted source images.",
+            "# TYPE image_converter_files_total counter",
+            f'image_converter_files_total{{status="success"}} {summary["files"] - summary["failed"]}',
+            f'image_converter_files_total{{status="failure"}} {summary["failed"]}',
+            "# HELP image_converter_bytes_total Bytes read and written.",
+            "# TYPE image_converter_bytes_total counter",
+            f'image_converter_bytes_total{{direction="in"}} {summary["bytes_in"]}',
+            f'image_converter_bytes_total{{direction="out"}} {summary["bytes_out"]}',
+            "# HELP image_converter_run_seconds Wall time of the run.",
+            "# TYPE image_converter_run_seconds gauge",
+            f"image_converter_run_seconds {summary['elapsed']:.6f}",
+            "# HELP image_converter_stage_seconds Per-image time spent in each conversion stage.",
+            "# TYPE image_converter_stage_seconds summary",
+        ]
+        for stage in METRIC_STAGES:
+            values = summary["stages"][stage]
+            lines.append(f'image_converter_stage_seconds{{stage="{stage}",quantile="0.5"}} {values["p50"]:.6f}')
+            lines.append(f'image_converter_stage_seconds{{stage="{stage}",quantile="0.95"}} {values["p95"]:.6f}')
+            lines.append(f'image_converter_stage_seconds{{stage="{stage}",quantile="1"}} {values["max"]:.6f}')
+            lines.append(f'image_converter_stage_seconds_sum{{stage="{stage}"}} {values["sum"]:.6f}')
+            lines.append(f'image_converter_stage_seconds_count{{stage="{stage}"}} {summary["files"]}')
+        
+        # 先写临时文件再替换，避免采集到写了一半的文件
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+class RunReport:
+    """
+    运行报告
+    
+    每个输出目标完成后立即向报告文件追加一行JSON：
+        {"input", "output", "status": "ok"/"failed", "error_type", "error", "bytes_in", "bytes_out", "duration"}
+    其中 bytes_in 和 duration 为所属图片的输入大小和转换耗时（一张图片有多个目标时相同），
+    未知的字段为null，失败原因未知时 error_type 为 "Error"。报告关闭时追加一行 {"summary": {...}}（见 summary）。
+    内存中只保存计数和前 keep_failures 个失败项，与图片总数无关。
+    """
+    
+    def __init__(self, path=None, keep_failures=MAX_KEPT_FAILURES):
+        """
+        Args:
+            path: 报告文件路径（JSON Lines），为None时只在内存中汇总
+            keep_failures: 在内存中保留的失败项数
+        """
+        self.path = path
+        self.started = time.perf_counter()
+        self.success_count = 0
+        self.fail_count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.error_types = Counter()
+        self.keep_failures = keep_failures
+        self.failures = []
+        self.file = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(path, "w", encoding="utf-8")
+    
+    def add(self, results, stats=None, error_type=None):
+        """
+        记录一张图片各目标的转换结果
+        
+        Args:
+            results: (是否成功, 输入路径, 输出路径, 错误信息) 列表（见 convert_targets）
+            stats: convert_targets 填写的统计字典，提供字节数、耗时和错误类型
+            error_type: 没有统计信息时失败项的错误类型
+        """
+        stats = stats or {}
+        sizes = stats.get("sizes") or [None] * len(results)
+        errors = stats.get("errors") or [None] * len(results)
+        # 输入大小每张图片只计一次
+        self.bytes_in += stats.get("bytes_in") or 0
+        for (success, input_path, output_path, error), size, error_name in zip(results, sizes, errors):
+            self._record(success, input_path, output_path, error, error_name or error_type,
+                         stats.get("bytes_in"), size, stats.get("total"))
+    
+    def add_result(self, success, input_path, output_path, error=None, error_type=None, bytes_in=None, bytes_out=None, duration=None):
+        """
+        记录一个输出目标的转换结果（不经过 convert_targets 的结果，如压缩包中的图片）
+        """
+        self.bytes_in += bytes_in or 0
+        self._record(success, input_path, output_path, error, error_type, bytes_in, bytes_out, duration)
+    
+    def _record(self, success, input_path, output_path, error, error_type, bytes_in, bytes_out, duration):
+        if success:
+            self.success_count += 1
+            error_type = None
+        else:
+            self.fail_count += 1
+            error_type = error_type or "Error"
+            self.error_types[error_type] += 1
+            if len(self.failures) < self.keep_failures:
+                self.failures.append((input_path, error))
+        self.bytes_out += bytes_out or 0
+        
+        if self.file:
+            entry = {
+                "input": input_path,
+                "output": output_path,
+                "status": "ok" if success else "failed",
+                "error_type": error_type,
+                "error": error,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "duration": round(duration, 6) if duration is not None else None,
+            }
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+    
+    def summary(self):
+        """
+        汇总结果
+        
+        Returns:
+            dict: total、succeeded、failed、bytes_in、bytes_out、elapsed（秒）、error_types（错误类型 -> 次数）
+        """
+        return {
+            "total": self.success_count + self.fail_count,
+            "succeeded": self.success_count,
+            "failed": self.fail_count,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "elapsed": round(time.perf_counter() - self.started, 3),
+            "error_types": dict(self.error_types.most_common()),
+        }
+    
+    def print_failures(self, file=None):
+        """
+        打印保留的失败项，超出的部分只给出数量
+        """
+        if not self.fail_count:
+            return
+        print("\n失败列表：", file=file)
+        for img_path, error in self.failures:
+            print(f"  {img_path}: {error}", file=file)
+        hidden = self.fail_count - len(self.failures)
+        if hidden:
+            where = f"，详见报告文件 {os.path.abspath(self.path)}" if self.path else ""
+            print(f"  ... 还有 {hidden} 个失败项{where}", file=file)
+        print("失败原因：" + "，".join(f"{name} {count} 个" for name, count in self.error_types.most_common()), file=file)
+    
+    def close(self):
+        """
+        写入汇总行并关闭报告文件
+        """
+        if self.file:
+            self.file.write(json.dumps({"summary": self.summary()}, ensure_ascii=False) + "\n")
+            self.file.close()
+            self.file = None
+
+def parse_size(value):
+    """
+    解析 WxH 形式的尺寸参数（如 800x600，单个数字表示宽高相同）
+    
+    Args:
+        value: 尺寸字符串
+        
+    Returns:
+        tuple: (宽, 高)
+    """
+    parts = value.lower().split("x")
+    try:
+        if len(parts) == 1:
+            size = (int(parts[0]), int(parts[0]))
+        elif len(parts) == 2:
+            size = (int(parts[0]), int(parts[1]))
+        else:
+            raise ValueError(value)
+    except ValueError:
+        raise ValueError(f"无效的尺寸 '{value}'，应为 宽x高，如 800x600")
+    if size[0] < 1 or size[1] < 1:
+        raise ValueError(f"无效的尺寸 '{value}'，宽和高必须大于0")
+    return size
+
+# 字节数参数的单位（二进制单位，如 512M、4G）
+BYTE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_bytes(value):
+    """
+    解析字节数参数（如 4096、512K、1.5M、4G，单位不区分大小写，可带B）
+    
+    Args:
+        value: 字节数字符串
+        
+    Returns:
+        int: 字节数
+    """
+    text = value.strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in BYTE_UNITS else ""
+    try:
+        number = float(text[:len(text) - len(unit)])
+    except ValueError:
+        raise ValueError(f"无效的大小 '{value}'，应为字节数或带单位的数值，如 512M、4G")
+    if number <= 0:
+        raise ValueError(f"无效的大小 '{value}'，必须大于0")
+    return int(number * BYTE_UNITS[unit])
+
+def compute_target_size(size, max_size=None, scale=None):
+    """
+    计算缩放后的尺寸
+    
+    先按比例缩放，再等比缩小到不超过最大尺寸（不会因最大尺寸而放大）。
+    
+    Args:
+        size: 原始尺寸 (宽, 高)
+        max_size: 最大尺寸 (宽, 高)，为None时不限制
+        scale: 缩放比例，为None时不缩放
+        
+    Returns:
+        tuple: 目标尺寸 (宽, 高)
+    """
+    width, height = size
+    if scale:
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    if max_size:
+        ratio = min(max_size[0] / width, max_size[1] / height)
+        if ratio < 1:
+            width, height = max(1, round(width * ratio)), max(1, round(height * ratio))
+    return width, height
+
+def make_target(target_format, quality=85, output_dir="output", max_size=None, scale=None, profile=DEFAULT_PROFILE, save_options=None, passthrough=None,
+                background=None, max_bytes=None, shrink_to_fit=False):
+    """
+    生成一个输出目标
+    
+    Args:
+        target_format: 目标格式（如jpg、png等）
+        quality: 输出图片质量（0-100）
+        output_dir: 输出目录路径
+        max_size: 最大尺寸 (宽, 高)，超过时等比缩小
+        scale: 缩放比例
+        profile: 编码配置（见 ENCODE_PROFILES）
+        save_options: 覆盖编码配置中保存参数的字典，如 {"optimize": False}
+        passthrough: 输入已是目标格式且无需缩放时的处理方式（copy/link），
+            为None时总是重新编码
+        background: 目标格式不支持透明时透明部分合成到的背景色（见 parse_background），
+            为None时使用白色
+        max_bytes: 输出文件大小上限（字节），有损格式自动降低质量以满足上限（见 encode_image）
+        shrink_to_fit: 最低质量仍超出 max_bytes 时（或无损格式）是否缩小尺寸
+        
+    Returns:
+        dict: 输出目标
+    """
+    return {
+        "format": target_format.lower(),
+        "quality": quality,
+        "output_dir": output_dir,
+        "max_size": tuple(max_size) if max_size else None,
+        "scale": scale,
+        "profile": profile,
+        "save_options": dict(save_options) if save_options else None,
+        "passthrough": passthrough,
+        "background": background,
+        "max_bytes": max_bytes,
+        "shrink_to_fit": shrink_to_fit,
+    }
+
+def target_save_params(target):
+    """
+    输出目标最终传给 img.save 的参数
+    
+    Args:
+        target: 输出目标（见 make_target）
+        
+    Returns:
+        dict: img.save 的关键字参数
+    """
+    save_params = build_save_params(target["format"], target["quality"], target.get("profile", DEFAULT_PROFILE))
+    if target.get("save_options"):
+        save_params.update(target["save_options"])
+    return save_params
+
+def set_target_option(options, key, value, where):
+    """
+    把一项输出目标参数写入 make_target 的关键字参数字典
+    
+    Args:
+        options: make_target 的关键字参数字典
+        key: 参数名（小写，以下划线分隔，如 max_size）
+        value: 参数值（字符串，或JSON中的数字、列表）
+        where: 出错时在错误信息中指明的位置，如 "输出目标 'format=webp'"
+        
+    Raises:
+        ValueError: 参数名未知或参数值无效时
+    """
+    if key == "format":
+        options["target_format"] = str(value)
+    elif key == "quality":
+        options["quality"] = int(value)
+    elif key in ("output", "output_dir"):
+        options["output_dir"] = str(value)
+    elif key == "max_size":
+        # JSON 中可以写为 [宽, 高]
+        if isinstance(value, (list, tuple)):
+            value = "x".join(map(str, value))
+        options["max_size"] = parse_size(str(value))
+    elif key == "scale":
+        options["scale"] = float(value)
+    elif key == "passthrough":
+        if value not in PASSTHROUGH_METHODS:
+            raise ValueError(f"{where} 中的 passthrough '{value}' 无效，可选：{'/'.join(PASSTHROUGH_METHODS)}")
+        options["passthrough"] = value
+    elif key == "profile":
+        if value not in ENCODE_PROFILES:
+            raise ValueError(f"{where} 中的编码配置 '{value}' 无效，可选：{'/'.join(ENCODE_PROFILES)}")
+        options["profile"] = value
+    elif key == "background":
+        options["background"] = parse_background(str(value))
+    elif key == "max_bytes":
+        options["max_bytes"] = parse_bytes(str(value))
+    elif key == "shrink_to_fit":
+        text = str(value).lower()
+        if text not in ("1", "0", "true", "false", "yes", "no"):
+            raise ValueError(f"{where} 中的 shrink-to-fit '{value}' 无效，可选：yes/no")
+        options["shrink_to_fit"] = text in ("1", "true", "yes")
+    else:
+        raise ValueError(f"{where} 中有未知的选项 '{key}'")
+
+def parse_target(spec, defaults):
+    """
+    解析 --target 参数，如 format=webp,quality=80,max-size=320x320,output=thumbs,profile=fast
+    
+    Args:
+        spec: 目标描述字符串
+        defaults: 未指定的项使用的默认值（make_target 的关键字参数）
+        
+    Returns:
+        dict: 输出目标
+    """
+    options = dict(defaults)
+    for item in spec.split(","):
+        key, sep, value = item.partition("=")
+        key = key.strip().lower().replace("-", "_")
+        value = value.strip()
+        if not sep or not value:
+            raise ValueError(f"无效的输出目标 '{spec}'，应为 键=值，以逗号分隔")
+        set_target_option(options, key, value, f"输出目标 '{spec}'")
+    if "target_format" not in options:
+        raise ValueError(f"输出目标 '{spec}' 缺少 format")
+    return make_target(**options)
+
+def default_output_path(img_path, output_dir, target_format):
+    """
+    输出目录下与输入同名的输出路径（会创建输出目录）
+    
+    Args:
+        img_path: 输入图片路径
+        output_dir: 输出目录路径
+        target_format: 目标格式
+        
+    Returns:
+        str: 输出路径
+    """
+    # 确保输出目录存在
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 获取文件名（不含扩展名）
+    filename = os.path.splitext(os.path.basename(img_path))[0]
+    return os.path.join(output_dir, f"{filename}.{target_format.lower()}")
+
+def draft_image(img, sizes):
+    """
+    让JPEG解码器直接以较低分辨率解码
+    
+    draft() 会选择 1/2、1/4、1/8 中不小于所需尺寸的最大缩小倍数，
+    在DCT域完成缩小，不必先解码完整分辨率。多个目标共用一次解码时，
+    按其中最大的尺寸解码。必须在图片加载（load）之前调用。
+    
+    Args:
+        img: 刚打开、尚未加载的图片
+        sizes: 各输出目标需要的尺寸列表
+    """
+    if img.format != "JPEG" or not sizes:
+        return
+    width = max(size[0] for size in sizes)
+    height = max(size[1] for size in sizes)
+    if width < img.size[0] and height < img.size[1]:
+        img.draft(img.mode, (width, height))
+
+def resize_image(img, size):
+    """
+    缩放图片到指定尺寸
+    
+    resize 的 reducing_gap 会先用 reduce() 整数倍缩小，再做精确重采样。
+    
+    Args:
+        img: 图片
+        size: 目标尺寸 (宽, 高)
+        
+    Returns:
+        Image: 缩放后的图片（尺寸相同时返回原图片）
+    """
+    from PIL import Image
+    if img.size == tuple(size):
+        return img
+    
+    # 调色板和二值图片直接缩放只能使用最近邻，先转换以获得平滑结果
+    if img.mode in ("1", "P"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+def probe_image(img_path):
+    """
+    只读取文件头获取图片信息（不解码像素数据）
+    
+    Args:
+        img_path: 输入图片路径
+        
+    Returns:
+        dict: format、size、mode、frames、pixels（所有帧的像素总数）
+        
+    Raises:
+        文件无法识别时抛出异常（不检查文件是否完整，见 check_complete）
+    """
+    from PIL import Image
+    with Image.open(img_path) as img:
+        frames = getattr(img, "n_frames", 1)
+        return {
+            "format": img.format,
+            "size": img.size,
+            "mode": img.mode,
+            "frames": frames,
+            "pixels": img.size[0] * img.size[1] * frames,
+        }
+
+def _jpeg_complete(data):
+    """
+    按段结构查找 JPEG 的结束标记 EOI
+    
+    逐段跳过第一段压缩数据之前有长度的标记段（EXIF 缩略图中的 EOI 不会被误认），
+    再在压缩数据中查找 EOI：压缩数据中的 0xFF 后只能是 0x00 或 RST 标记，
+    因此之后出现的第一个 FFD9 就是结束标记。EOI 之后附加的数据
+    （如动态照片中的视频、MPO的第二张图片）不影响结果。
+    """
+    size = len(data)
+    if data[:2] != b"\xff\xd8":
+        return False
+    pos = 2
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return False
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 标记前的填充字节
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            if marker == 0xD9:
+                return True
+            pos += 2
+            continue
+        pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker == 0xDA:
+            # 渐进式JPEG各段压缩数据之间的表中极少出现 FFD9，出现时由解码时的截断检查兜底
+            return data.find(b"\xff\xd9", pos) != -1
+    return data[pos:pos + 2] == b"\xff\xd9"
+
+def _png_complete(data):
+    """
+    按块结构查找 PNG 的 IEND 块（只读取各块的长度，不读取块的内容）
+    """
+    size = len(data)
+    if data[:8] != PNG_SIGNATURE:
+        return False
+    pos = 8
+    while pos + 8 <= size:
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > size:
+            return False
+        if chunk_type == b"IEND":
+            return True
+        pos = end
+    return False
+
+# 检查文件是否完整的函数（按Pillow识别出的格式）
+COMPLETENESS_CHECKS = {"JPEG": _jpeg_complete, "PNG": _png_complete}
+
+# gif_frame_strategy 修改Pillow全局设置期间的状态
+_gif_strategy_lock = threading.Lock()
+_gif_strategy_users = 0
+_gif_strategy_saved = None
+
+@contextlib.contextmanager
+def gif_frame_strategy(img):
+    """
+    转换 GIF 期间，后续帧与第一帧调色板相同时保持调色板模式，不展开为RGB（Pillow 9.1+）
+    
+    GifImagePlugin.LOADING_STRATEGY 是整个进程的全局设置，只在转换期间修改并在之后恢复，
+    导入本模块的其他程序（如异步接口所在的服务）读取 GIF 的方式不受影响。
+    多个线程同时转换时由最后一个结束的线程恢复。其他格式的图片不做任何修改。
+    
+    Args:
+        img: 已打开的图片
+    """
+    global _gif_strategy_users, _gif_strategy_saved
+    if img.format != "GIF":
+        yield
+        return
+    # 打开 GIF 时Pillow已经导入了该插件
+    from PIL import GifImagePlugin
+    if not hasattr(GifImagePlugin, "LoadingStrategy"):
+        yield
+        return
+    
+    with _gif_strategy_lock:
+        if _gif_strategy_users == 0:
+            _gif_strategy_saved = GifImagePlugin.LOADING_STRATEGY
+            GifImagePlugin.LOADING_STRATEGY = GifImagePlugin.LoadingStrategy.RGB_AFTER_DIFFERENT_PALETTE_ONLY
+        _gif_strategy_users += 1
+    try:
+        yield
+    finally:
+        with _gif_strategy_lock:
+            _gif_strategy_users -= 1
+            if _gif_strategy_users == 0:
+                GifImagePlugin.LOADING_STRATEGY = _gif_strategy_saved
+
+def check_complete(img_path, format_name):
+    """
+    检查文件是否完整（有格式规定的结束标记），在解码或直接复制前排除被截断的文件
+    
+    JPEG 按段结构查找 EOI，PNG 按块结构查找 IEND 块；结束标记之后附加的数据不影响结果。
+    文件通过 mmap 访问，PNG 只读取各块的头部。其他格式不检查（解码时由Pillow报告截断）。
+    
+    Args:
+        img_path: 输入图片路径，或已读入内存的图片数据（bytes）
+        format_name: Pillow识别出的格式名
+        
+    Raises:
+        ValueError: 文件不完整时
+    """
+    check = COMPLETENESS_CHECKS.get(format_name)
+    if check is None:
+        return
+    if isinstance(img_path, (bytes, bytearray, memoryview)):
+        complete = check(bytes(img_path) if isinstance(img_path, memoryview) else img_path)
+    else:
+        with open(img_path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件不能映射
+                data = b""
+            with contextlib.closing(data) if data else contextlib.nullcontext():
+                complete = check(data)
+    if not complete:
+        raise ValueError(f"文件不完整（缺少{format_name}结束标记），可能已被截断")
+
+def can_passthrough(img, target, size):
+    """
+    判断输出目标能否直接复制输入文件而不重新编码
+    
+    需要目标开启了直接复制、输入已经是目标格式、无需缩放，且没有指定额外的保存参数和大小上限。
+    
+    Args:
+        img: 已打开（尚未解码）的图片
+        target: 输出目标
+        size: 该目标需要的尺寸
+        
+    Returns:
+        bool: 可以直接复制时为True
+    """
+    return bool(
+        target.get("passthrough")
+        and img.format == pillow_format(target["format"])
+        and size == img.size
+        and not target.get("save_options")
+        and not target.get("max_bytes")
+    )
+
+def temp_path_for(path):
+    """
+    与输出文件位于同一目录的临时文件路径（同一文件系统内才能原子替换）
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+
+def write_atomic(path, data):
+    """
+    原子地写入文件
+    
+    先写入同一目录下的临时文件，再用 os.replace 替换目标文件。进程在写入过程中被杀死时，
+    目标路径要么不存在、要么是完整的旧文件，不会留下看起来完整的截断文件。
+    
+    Args:
+        path: 输出文件路径
+        data: 文件内容（bytes）
+    """
+    temp_path = temp_path_for(path)
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def place_file(src_path, dst_path, method="copy"):
+    """
+    把输入文件原样放到输出路径（与 write_atomic 一样先放到临时路径再替换）
+    
+    Args:
+        src_path: 输入文件路径
+        dst_path: 输出文件路径
+        method: copy复制；link硬链接（跨文件系统等无法链接时退回复制）
+    """
+    # 输出目录与输入目录相同时不要替换源文件
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        return
+    temp_path = temp_path_for(dst_path)
+    try:
+        linked = False
+        if method == "link":
+            try:
+                os.link(src_path, temp_path)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            shutil.copyfile(src_path, temp_path)
+        os.replace(temp_path, dst_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class ConversionCache:
+    """
+    内容寻址的转换结果缓存
+    
+    以（输入文件内容的SHA-256，转换参数）为键保存已经生成的输出文件。内容相同的图片
+    （同一批次内文件名不同，或多次运行之间）直接从缓存硬链接（无法链接时复制）结果，
+    只需计算一次摘要，不再解码和编码。缓存按最近使用时间（文件修改时间）淘汰，
+    总大小超过上限时删除最久未使用的条目。
+    
+    对象只保存目录和大小上限，可以传给转换进程使用；淘汰由主进程调用 evict 完成。
+    """
+    
+    def __init__(self, cache_dir, max_bytes=None):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），为None时不淘汰
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def key(digest, target):
+        """
+        计算缓存键
+        
+        Args:
+            digest: 输入文件内容的SHA-256（见 file_digest）
+            target: 输出目标
+            
+        Returns:
+            str: 缓存键
+        """
+        import hashlib
+        params = {
+            "version": CACHE_VERSION,
+            "save": target_save_params(target),
+            "max_size": target["max_size"],
+            "scale": target["scale"],
+            "background": target.get("background"),
+            "max_bytes": target.get("max_bytes"),
+            "shrink_to_fit": target.get("shrink_to_fit"),
+        }
+        text = digest + json.dumps(params, sort_keys=True)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _path(self, key):
+        # 按前两位分子目录，避免单个目录下文件过多
+        return os.path.join(self.cache_dir, key[:2], key)
+    
+    def fetch(self, key, output_path):
+        """
+        从缓存取出结果放到输出路径
+        
+        Returns:
+            bool: 命中缓存时为True
+        """
+        path = self._path(key)
+        try:
+            place_file(path, output_path, "link")
+        except FileNotFoundError:
+            return False
+        # 更新修改时间，记录为最近使用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+    
+    def store(self, key, output_path):
+        """
+        把刚生成的输出文件加入缓存
+        """
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        place_file(output_path, path, "link")
+    
+    def evict(self):
+        """
+        缓存总大小超过上限时，删除最久未使用的条目
+        
+        Returns:
+            int: 删除的条目数
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = []
+        total = 0
+        for group in os.scandir(self.cache_dir):
+            if not group.is_dir():
+                continue
+            for entry in os.scandir(group.path):
+                # 跳过正在写入的临时文件
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+def parse_background(value):
+    """
+    解析背景色参数（颜色名、#rrggbb 或 rgb(r, g, b) 等 Pillow 支持的写法）
+    
+    Args:
+        value: 颜色字符串
+        
+    Returns:
+        str: 统一为 #rrggbb 形式的颜色
+    """
+    from PIL import ImageColor
+    try:
+        red, green, blue = ImageColor.getrgb(value.strip())[:3]
+    except ValueError:
+        raise ValueError(f"无效的背景色 '{value}'，应为颜色名或 #rrggbb，如 white、#000000")
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+def has_alpha(img):
+    """
+    判断图片是否带有透明信息（透明通道，或调色板、灰度、RGB图片的透明色）
+    """
+    return img.mode in ALPHA_MODES or "transparency" in img.info
+
+def prepare_mode(img, target_format, background=None):
+    """
+    把图片转换为目标格式可以保存的颜色模式
+    
+    目标格式可以直接保存的模式不做转换，但以透明色表示透明的图片在不能保存透明色的
+    格式（见 TRANSPARENCY_KEY_FORMATS）中转换为带透明通道的模式。目标格式不支持透明时，透明部分一次合成到
+    背景色上（paste 以透明通道为蒙版，不逐像素处理），而不是直接丢弃透明通道；
+    16位灰度按比例缩小到8位，CMYK 等其他模式转换为RGB。
+    
+    Args:
+        img: 图片
+        target_format: 目标格式
+        background: 背景色（见 parse_background），为None时使用白色
+        
+    Returns:
+        Image: 转换后的图片（无需转换时返回原图片）
+    """
+    from PIL import Image
+    format_name = pillow_format(target_format)
+    modes = FORMAT_MODES.get(format_name, {"RGB", "RGBA"})
+    keeps_alpha = "RGBA" in modes
+    alpha = has_alpha(img)
+    keeps_transparency = img.mode in ALPHA_MODES or format_name in TRANSPARENCY_KEY_FORMATS
+    if img.mode in modes and (not alpha or keeps_alpha and keeps_transparency):
+        return img
+    gray = img.mode in GRAY_MODES
+    
+    if alpha:
+        if keeps_alpha:
+            return img.convert("LA" if gray and "LA" in modes else "RGBA")
+        # 目标格式不支持透明：合成到背景色上，灰度图片保持灰度
+        mode = "L" if gray and "L" in modes else "RGB"
+        source = img.convert("LA" if mode == "L" else "RGBA")
+        flattened = Image.new(mode, img.size, background or DEFAULT_BACKGROUND)
+        flattened.paste(source, mask=source)
+        return flattened
+    
+    if img.mode.startswith("I"):
+        if "I;16" in modes:
+            return img.convert("I;16")
+        # 16位灰度：按比例缩小到8位（直接 convert("L") 会把大于255的值截断为白色）
+        if img.mode != "I":
+            img = img.convert("I")
+        img = img.point(lambda value: value / 256).convert("L")
+    elif img.mode in ("1", "F"):
+        img = img.convert("L")
+    if img.mode in modes:
+        return img
+    return img.convert("RGB")
+
+def render_frames(img, size, target_format, background=None):
+    """
+    逐帧缩放并转换颜色模式，用于保存动画或多页图片
+    
+    帧按顺序逐个解码，只保留处理后的帧（调色板帧保持调色板模式），
+    并保留每帧的时长、GIF的处置方式和循环次数。
+    
+    Args:
+        img: 多帧图片
+        size: 目标尺寸
+        target_format: 目标格式（需在 ANIMATED_FORMATS 中）
+        background: 目标格式不支持透明时的背景色
+        
+    Returns:
+        tuple: (第一帧, 额外的保存参数)
+    """
+    from PIL import ImageSequence
+    format_name = pillow_format(target_format)
+    frames = []
+    durations = []
+    disposals = []
+    for frame in ImageSequence.Iterator(img):
+        durations.append(frame.info.get("duration", 0))
+        disposals.append(getattr(frame, "disposal_method", 0))
+        rendered = prepare_mode(resize_image(frame, size), target_format, background)
+        # 迭代器在同一个图片对象上切换帧，未经处理的帧需要复制
+        frames.append(rendered.copy() if rendered is frame else rendered)
+    img.seek(0)
+    
+    params = {"save_all": True, "append_images": frames[1:]}
+    if format_name in ("GIF", "WEBP"):
+        if any(durations):
+            params["duration"] = durations
+        if "loop" in img.info:
+            params["loop"] = img.info["loop"]
+    if format_name == "GIF":
+        params["disposal"] = disposals
+    return frames[0], params
+
+def _encode(img, save_params, frame_params):
+    buffer = io.BytesIO()
+    img.save(buffer, **save_params, **frame_params)
+    return buffer.getvalue()
+
+def _fit_quality(img, save_params, frame_params, max_bytes):
+    """
+    在 [MIN_FIT_QUALITY, 目标质量] 范围内二分查找不超过 max_bytes 的最高质量
+    
+    先按目标质量编码，满足上限时只编码一次；否则每个质量最多编码一次（最多约7次）。
+    
+    Returns:
+        bytes: 满足上限的最高质量的编码结果；都不满足时为最小的结果
+    """
+    data = _encode(img, save_params, frame_params)
+    if len(data) <= max_bytes or "quality" not in save_params:
+        return data
+    
+    best = None
+    smallest = data
+    low, high = MIN_FIT_QUALITY, save_params["quality"] - 1
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _encode(img, dict(save_params, quality=quality), frame_params)
+        if len(candidate) <= max_bytes:
+            best = candidate
+            low = quality + 1
+        else:
+            smallest = min(smallest, candidate, key=len)
+            high = quality - 1
+    return best if best is not None else smallest
+
+def encode_image(img, target, frame_params=None):
+    """
+    把准备好的图片编码到内存
+    
+    输出目标指定了 max_bytes 时，有损格式（JPEG、WebP）降低质量直到不超过上限（见 _fit_quality）。
+    最低质量仍然超出（或无损格式超出）且允许缩小（shrink_to_fit）时，按超出的比例从原尺寸
+    缩小后重新查找。所有尝试都在内存中编码同一张已解码的图片，不会重新解码输入。
+    
+    Args:
+        img: 已转换颜色模式的图片（见 render_target）
+        target: 输出目标（见 make_target）
+        frame_params: 多帧图片的额外保存参数
+        
+    Returns:
+        bytes: 编码后的图片数据
+        
+    Raises:
+        ValueError: 无法满足大小上限时
+    """
+    frame_params = frame_params or {}
+    save_params = target_save_params(target)
+    max_bytes = target.get("max_bytes")
+    if not max_bytes:
+        return _encode(img, save_params, frame_params)
+    
+    original = img
+    ratio = 1.0
+    for attempt in range(MAX_FIT_SHRINKS + 1):
+        data = _fit_quality(img, save_params, frame_params, max_bytes)
+        if len(data) <= max_bytes:
+            return data
+        # 多帧图片逐帧缩小的代价较高，不自动缩小
+        if not target.get("shrink_to_fit") or "append_images" in frame_params or attempt == MAX_FIT_SHRINKS:
+            break
+        # 文件大小大致与像素数成正比，按超出的比例缩小，再多缩小一些以减少尝试次数
+        ratio *= (max_bytes / len(data)) ** 0.5 * 0.9
+        size = (max(1, round(original.width * ratio)), max(1, round(original.height * ratio)))
+        img = prepare_mode(resize_image(original, size), target["format"], target.get("background"))
+    raise ValueError(f"无法压缩到 {max_bytes} 字节以内（最小为 {len(data)} 字节）")
+
+def render_target(img, size, target_format, background=None):
+    """
+    为一个输出目标准备要保存的图片
+    
+    多帧图片输出为支持多帧的格式时保留所有帧，否则只处理当前（第一）帧。
+    
+    Args:
+        img: 已解码的图片
+        size: 目标尺寸
+        target_format: 目标格式
+        background: 目标格式不支持透明时的背景色
+        
+    Returns:
+        tuple: (要保存的图片, 额外的保存参数)
+    """
+    if getattr(img, "n_frames", 1) > 1 and pillow_format(target_format) in ANIMATED_FORMATS:
+        return render_frames(img, size, target_format, background)
+    return prepare_mode(resize_image(img, size), target_format, background), {}
+
+def convert_targets(img_path, targets, output_paths=None, stats=None, cache=None):
+    """
+    一次解码，转换为多个输出目标
+    
+    图片只打开和解码一次（JPEG按最大的目标尺寸解码），
+    解码结果由所有目标共用，各目标再分别缩放、转换模式和编码。
+    允许直接复制的目标（见 can_passthrough）不解码也不编码，
+    所有目标都直接复制时图片完全不会被解码。使用缓存时读取文件头后计算输入内容的摘要，
+    命中缓存的目标直接取出结果，所有目标都命中时图片不会被解码；
+    直接复制的目标不查缓存（缓存的键不包括直接复制方式，命中会得到重新编码的结果）。
+    
+    Args:
+        img_path: 输入图片路径
+        targets: 输出目标列表（见 make_target）
+        output_paths: 与 targets 对应的输出路径列表，由 OutputPlanner 预先规划；
+            为None时输出到各目标输出目录下的同名文件
+        stats: 传入字典时记录各阶段耗时（秒）和输入输出字节数：
+            open（使用缓存时包括计算摘要）、decode、convert、encode、write、total、
+            bytes_in、bytes_out，以及直接复制的目标数 passthrough 和命中缓存的目标数 cache_hits
+            （多个目标的 convert、encode、write、bytes_out 累加）；
+            另有与 targets 对应的 sizes（各目标的输出字节数）和 errors（失败的异常类名）
+        cache: ConversionCache 实例，为None时不使用缓存
+        
+    Returns:
+        list: 每个目标一个 (是否成功, 输入路径, 输出路径, 错误信息)；
+            失败时输出路径为 output_paths 中规划的路径（未规划时为None）
+    """
+    from PIL import Image
+    if stats is None:
+        stats = {}
+    stats.update(input=img_path, open=0.0, decode=0.0, convert=0.0, encode=0.0, write=0.0, bytes_in=0, bytes_out=0,
+                 passthrough=0, cache_hits=0, sizes=[None] * len(targets), errors=[None] * len(targets))
+    
+    results = [None] * len(targets)
+    keys = [None] * len(targets)
+    
+    def planned_path(index):
+        # 失败时返回预先规划的输出路径，便于调用方对应到具体的任务
+        return output_paths[index] if output_paths else None
+    
+    def succeeded(index, output_path, size):
+        stats["bytes_out"] += size
+        stats["sizes"][index] = size
+        return (True, img_path, output_path, None)
+    
+    def failed(index, e):
+        stats["errors"][index] = type(e).__name__
+        return (False, img_path, planned_path(index), str(e))
+    
+    def output_path_for(index):
+        output_path = output_paths[index] if output_paths else None
+        if output_path is None:
+            output_path = default_output_path(img_path, targets[index]["output_dir"], targets[index]["format"])
+        return output_path
+    
+    start = time.perf_counter()
+    try:
+        stats["bytes_in"] = os.path.getsize(img_path)
+        
+        # 打开图片（只读取文件头）
+        with Image.open(img_path) as img, gif_frame_strategy(img):
+            original_size = img.size
+            sizes = [compute_target_size(original_size, target["max_size"], target["scale"]) for target in targets]
+            passthrough = [can_passthrough(img, target, size) for target, size in zip(targets, sizes)]
+            
+            # 再查缓存，内容相同的图片直接取出之前的结果；直接复制的目标不查缓存
+            # （缓存中只有重新编码的结果，复制也比读取整个文件计算摘要更快）
+            if cache is not None and not all(passthrough):
+                digest = file_digest(img_path)
+                for index, target in enumerate(targets):
+                    if passthrough[index]:
+                        continue
+                    try:
+                        keys[index] = cache.key(digest, target)
+                        output_path = output_path_for(index)
+                        if cache.fetch(keys[index], output_path):
+                            stats["cache_hits"] += 1
+                            results[index] = succeeded(index, output_path, os.path.getsize(output_path))
+                    except Exception as e:
+                        results[index] = failed(index, e)
+            remaining = [index for index, result in enumerate(results) if result is None]
+            opened = time.perf_counter()
+            stats["open"] = opened - start
+            
+            if remaining:
+                # 解码前先排除不完整的文件
+                check_complete(img_path, img.format)
+                
+                # 只有需要重新编码的目标才解码；所有这些目标都需要缩小时，JPEG在解码时直接缩小
+                encode_sizes = [sizes[index] for index in remaining if not passthrough[index]]
+                if encode_sizes:
+                    if all(size != original_size for size in encode_sizes):
+                        draft_image(img, encode_sizes)
+                    img.load()
+                decoded = time.perf_counter()
+                stats["decode"] = decoded - opened
+                
+                for index in remaining:
+                    target = targets[index]
+                    try:
+                        output_path = output_path_for(index)
+                        
+                        # 已经是目标格式且无需缩放，直接复制或硬链接
+                        if passthrough[index]:
+                            stage_start = time.perf_counter()
+                            place_file(img_path, output_path, target["passthrough"])
+                            stats["write"] += time.perf_counter() - stage_start
+                            stats["passthrough"] += 1
+                            results[index] = succeeded(index, output_path, stats["bytes_in"])
+                            continue
+                        
+                        # 缩放并处理不同模式的图片（多帧图片逐帧处理）
+                        stage_start = time.perf_counter()
+                        converted, frame_params = render_target(img, sizes[index], target["format"], target.get("background"))
+                        converted_at = time.perf_counter()
+                        
+                        # 先编码到内存（限制大小时可能尝试多个质量），再原子地写入文件，分别计时
+                        data = encode_image(converted, target, frame_params)
+                        encoded_at = time.perf_counter()
+                        
+                        write_atomic(output_path, data)
+                        if keys[index] is not None:
+                            cache.store(keys[index], output_path)
+                        written_at = time.perf_counter()
+                        
+                        stats["convert"] += converted_at - stage_start
+                        stats["encode"] += encoded_at - converted_at
+                        stats["write"] += written_at - encoded_at
+                        results[index] = succeeded(index, output_path, len(data))
+                    except Exception as e:
+                        results[index] = failed(index, e)
+    except Exception as e:
+        # 打开或解码失败时所有尚未完成的目标都失败
+        results = [result or failed(index, e) for index, result in enumerate(results)]
+    
+    stats["total"] = time.perf_counter() - start
+    return results
+
+def _convert_task(img_path, targets, output_paths, with_stats, cache=None):
+    """
+    进程池中执行的转换任务
+    
+    Returns:
+        tuple: (结果列表, 统计信息字典或None)
+    """
+    stats = {} if with_stats else None
+    results = convert_targets(img_path, targets, output_paths, stats, cache)
+    return results, stats
+
+def convert_image(img_path, output_dir, target_format, quality=85, output_path=None, max_size=None, scale=None, profile=DEFAULT_PROFILE):
+    """
+    转换单张图片的格式
+    
+    Args:
+        img_path: 输入图片路径
+        output_dir: 输出目录路径
+        target_format: 目标格式（如jpg、png等）
+        quality: 输出图片质量（0-100）
+        output_path: 输出文件路径，由 OutputPlanner 预先规划（目录已创建）；
+            为None时输出到 output_dir 下的同名文件
+        max_size: 最大尺寸 (宽, 高)，超过时等比缩小
+        scale: 缩放比例
+        profile: 编码配置（见 ENCODE_PROFILES）
+        
+    Returns:
+        tuple: (是否成功, 输入路径, 输出路径, 错误信息)
+    """
+    target = make_target(target_format, quality, output_dir, max_size, scale, profile)
+    return convert_targets(img_path, [target], [output_path])[0]
+
+def convert_buffer(data, target):
+    """
+    在内存中转换一张图片
+    
+    与 convert_targets 的单个目标相同的处理流程，但输入和输出都是字节，
+    不读写文件，供流模式、压缩包和异步接口等不经过文件系统的场景使用。
+    
+    Args:
+        data: 输入图片数据（bytes）
+        target: 输出目标（见 make_target）
+        
+    Returns:
+        bytes: 编码后的图片数据；允许直接复制时原样返回输入数据
+        
+    Raises:
+        图片无法识别、不完整或编码失败时抛出异常
+    """
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img, gif_frame_strategy(img):
+        check_complete(data, img.format)
+        size = compute_target_size(img.size, target["max_size"], target["scale"])
+        if can_passthrough(img, target, size):
+            return bytes(data)
+        
+        if size != img.size:
+            draft_image(img, [size])
+        img.load()
+        converted, frame_params = render_target(img, size, target["format"], target.get("background"))
+        return encode_image(converted, target, frame_params)
+
+def convert_source(source, target, output_path=None):
+    """
+    转换一张图片，输入可以是数据或文件路径，结果返回数据或原子地写入文件
+    
+    供异步接口和转换服务在执行器中调用。
+    
+    Args:
+        source: 输入图片数据（bytes）或图片文件路径
+        target: 输出目标（见 make_target）
+        output_path: 输出文件路径（目录不存在时创建），为None时返回转换后的数据
+        
+    Returns:
+        bytes 或 str: 转换后的数据，或输出文件路径
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            source = f.read()
+    data = convert_buffer(source, target)
+    if output_path is None:
+        return data
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    write_atomic(output_path, data)
+    return output_path
+
+def convert_bytes(data, target_format, quality=85, max_size=None, scale=None, profile=DEFAULT_PROFILE, background=None):
+    """
+    转换内存中的图片数据
+    
+    Args:
+        data: 输入图片数据（bytes）
+        target_format: 目标格式（如jpg、png等）
+        quality: 输出图片质量（0-100）
+        max_size: 最大尺寸 (宽, 高)，按比例缩小到不超过该尺寸
+        scale: 缩放比例
+        profile: 编码配置（见 ENCODE_PROFILES）
+        background: 目标格式不支持透明时的背景色（见 parse_background）
+        
+    Returns:
+        bytes: 转换后的图片数据
+    """
+    return convert_buffer(data, make_target(target_format, quality, None, max_size, scale, profile, background=background))
+
+# 输出压缩包的扩展名：(压缩包格式, tar的压缩方式)
+ARCHIVE_EXTENSIONS = {
+    ".zip": ("zip", ""),
+    ".tar": ("tar", ""),
+    ".tar.gz": ("tar", "gz"),
+    ".tgz": ("tar", "gz"),
+    ".tar.bz2": ("tar", "bz2"),
+    ".tar.xz": ("tar", "xz"),
+}
+
+def archive_format_from_path(path):
+    """
+    根据文件扩展名判断压缩包格式
+    
+    Returns:
+        tuple: (压缩包格式, tar的压缩方式)，不是压缩包扩展名时返回None
+    """
+    name = path.lower()
+    for extension, archive_format in ARCHIVE_EXTENSIONS.items():
+        if name.endswith(extension):
+            return archive_format
+    return None
+
+def safe_member_path(name):
+    """
+    把压缩包内的路径转换为可以安全写入输出目录的相对路径
+    
+    Returns:
+        str: 相对路径；绝对路径或包含 .. 而会写到输出目录之外时返回None
+    """
+    path = os.path.normpath(name.replace("\\", "/"))
+    if os.path.isabs(path) or path == os.pardir or path.startswith(os.pardir + os.sep):
+        return None
+    return path
+
+def detect_archive(head):
+    """
+    根据数据开头判断是否为压缩包
+    
+    Args:
+        head: 数据开头的至少512字节（数据较短时为全部数据）
+        
+    Returns:
+        str: zip、tar（包括gzip、bzip2、xz压缩的tar），不是压缩包时返回None
+    """
+    if head.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        return "zip"
+    if head.startswith((b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")) or head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+def iter_archive_images(fileobj, archive_format):
+    """
+    逐个读取压缩包中的图片，不解压到磁盘
+    
+    tar 以流方式顺序读取（可以直接读标准输入）；zip 需要可随机访问的文件对象。
+    非图片文件和目录被忽略。
+    
+    Args:
+        fileobj: 压缩包文件对象
+        archive_format: zip 或 tar
+        
+    Yields:
+        tuple: (压缩包内的路径, 图片数据)
+    """
+    if archive_format == "zip":
+        import zipfile
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in IMAGE_EXTENSIONS:
+                    yield info.filename, archive.read(info)
+    else:
+        import tarfile
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and os.path.splitext(member.name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield member.name, archive.extractfile(member).read()
+
+class ArchiveWriter:
+    """
+    把转换结果写入压缩包
+    
+    tar 以流方式写入，输出可以是标准输出等不可随机访问的文件对象；
+    zip 中的图片已经压缩过，按存储方式写入不再压缩。
+    同一压缩包内的输出文件名冲突时自动添加序号。
+    """
+    
+    def __init__(self, fileobj, archive_format, compression=""):
+        self.archive_format = archive_format
+        if archive_format == "zip":
+            import zipfile
+            self.archive = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_STORED)
+        else:
+            import tarfile
+            self.archive = tarfile.open(fileobj=fileobj, mode=f"w|{compression}")
+        self.claimed = set()
+    
+    def member_name(self, name, target_format):
+        """
+        输出文件在压缩包中的路径：替换扩展名，冲突时添加序号
+        
+        包含 .. 而会解压到目录之外的路径只保留文件名，不把输入压缩包中的不安全路径带到输出中。
+        """
+        path = safe_member_path(name.lstrip("/")) or os.path.basename(name.replace("\\", "/"))
+        stem = os.path.splitext(path.replace(os.sep, "/"))[0]
+        extension = target_format.lower()
+        member = f"{stem}.{extension}"
+        index = 1
+        while member in self.claimed:
+            member = f"{stem}_{index}.{extension}"
+            index += 1
+        self.claimed.add(member)
+        return member
+    
+    def add(self, name, data):
+        """
+        写入一个文件
+        """
+        if self.archive_format == "zip":
+            self.archive.writestr(name, data)
+        else:
+            import tarfile
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+    
+    def close(self):
+        self.archive.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _reset_signals():
+    """
+    进程池子进程的初始化函数：忽略 SIGINT，SIGTERM 恢复默认处理
+    
+    子进程不继承主进程把信号转为 KeyboardInterrupt 的处理函数：按 Ctrl+C 时由主进程统一停止
+    （关闭进程池后子进程自行退出）；整组进程收到 SIGTERM 时（如 timeout、systemd 停止服务）
+    子进程直接退出，不会各自打印一次回溯。SIGTERM 不能忽略，进程池失效时要靠它结束剩余的子进程。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+class WorkerPool:
+    """
+    子进程异常退出后自动重建的进程池
+    
+    一个子进程异常退出（如被 OOM killer 杀死）后 ProcessPoolExecutor 整体失效：
+    所有未完成的任务都以 BrokenProcessPool 失败，之后也不能再提交任务。
+    WorkerPool 在提交时发现进程池已失效就重新创建，调用方只需把失败的任务记为失败，
+    不必中断整个批次。
+    """
+    
+    def __init__(self, workers):
+        """
+        Args:
+            workers: 进程数
+        """
+        self.workers = workers
+        self.executor = None
+        self.restarts = 0
+        # 尚未完成的任务，重建进程池时取消
+        self.outstanding = set()
+    
+    def _create(self):
+        from concurrent.futures import ProcessPoolExecutor
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_reset_signals)
+    
+    def submit(self, fn, *args):
+        """
+        提交任务（见 ProcessPoolExecutor.submit），进程池已失效时先重建
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        if self.executor is None:
+            self._create()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self.restart()
+            future = self.executor.submit(fn, *args)
+        self.outstanding.add(future)
+        future.add_done_callback(self.outstanding.discard)
+        return future
+    
+    def restart(self):
+        """
+        丢弃当前的进程池并重新创建
+        """
+        if self.executor is not None:
+            # 不使用 shutdown 的 cancel_futures 参数（Python 3.9 才有）
+            for future in list(self.outstanding):
+                future.cancel()
+            self.executor.shutdown(wait=False)
+        self.restarts += 1
+        self._create()
+    
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+def describe_error(e):
+    """
+    结果中的错误信息；进程池失效时给出可能的原因
+    """
+    from concurrent.futures.process import BrokenProcessPool
+    if isinstance(e, BrokenProcessPool):
+        return "转换进程异常退出（可能因内存不足被系统终止），该图片未完成"
+    return str(e)
+
+def _convert_member(name, source, target):
+    """
+    进程池中执行的内存转换任务
+    
+    Returns:
+        tuple: (名称, 是否成功, 转换后的数据, 错误信息, 统计信息)
+    """
+    start = time.perf_counter()
+    stats = {"bytes_in": None, "total": None, "error_type": None}
+    try:
+        if isinstance(source, str):
+            # 输入为文件路径时在子进程中读取，主进程不必读取文件内容
+            with open(source, "rb") as f:
+                source = f.read()
+        stats["bytes_in"] = len(source)
+        data = convert_buffer(source, target)
+        stats["total"] = time.perf_counter() - start
+        return name, True, data, None, stats
+    except Exception as e:
+        stats["total"] = time.perf_counter() - start
+        stats["error_type"] = type(e).__name__
+        return name, False, None, str(e), stats
+
+def convert_members(members, target, workers=DEFAULT_WORKERS, cancel_event=None, memory_budget=None):
+    """
+    并行转换内存中的图片（如压缩包中的文件）
+    
+    与 convert_images_multi 一样最多保留 workers 的2倍个任务在进程池中，
+    并可以按 memory_budget 限制同时转换的图片估算内存总量（文件头在线程中提前读取，
+    见 probe_ahead；目录输入时成员是文件路径，读取文件头需要I/O），
+    读取、转换和写出同时进行，内存占用与图片总数无关。
+    
+    Args:
+        members: (名称, 图片数据或图片文件路径) 的可迭代对象，名称（可以是任意对象）原样出现在结果中
+        target: 输出目标（见 make_target）
+        workers: 并行进程数
+        cancel_event: threading.Event，被设置后停止提交并取消排队中的任务
+        memory_budget: 同时转换的图片估算内存总量上限（字节），为None时不限制
+        
+    Yields:
+        tuple: 按完成顺序产出 (名称, 是否成功, 转换后的数据, 错误信息, 统计信息)，
+            统计信息为 {"bytes_in": 输入字节数, "total": 转换耗时（秒）, "error_type": 失败的异常类名}，
+            未知的项为None
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+    max_pending = workers * 2
+    with WorkerPool(workers) as executor:
+        pending = {}
+        
+        def must_wait(cost):
+            if len(pending) >= max_pending:
+                return True
+            return memory_budget is not None and sum(cost for _, cost in pending.values()) + cost > memory_budget
+        
+        def collect(future):
+            name = pending.pop(future)[0]
+            try:
+                return future.result()
+            except Exception as e:
+                # 子进程异常退出时只有该进程池中未完成的图片失败
+                return name, False, None, describe_error(e), {"bytes_in": None, "total": None, "error_type": type(e).__name__}
+        
+        if memory_budget is not None:
+            probed = probe_ahead(members, lambda member: estimate_memory(member[1], [target]), workers, max_pending)
+        else:
+            probed = (((name, data), 0) for name, data in members)
+        
+        for (name, data), cost in probed:
+            while pending and must_wait(cost):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield collect(future)
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            pending[executor.submit(_convert_member, name, data, target)] = (name, cost)
+        probed.close()
+        
+        if cancel_event is not None and cancel_event.is_set():
+            for future in pending:
+                future.cancel()
+        for future in list(pending):
+            if future.cancelled():
+                del pending[future]
+            else:
+                yield collect(future)
+
+def iter_image_files(input_dir, recursive=False):
+    """
+    逐个产出目录下的图片文件（生成器）
+    
+    基于 os.scandir 单次遍历目录，扩展名不区分大小写，
+    找到一个文件就产出一个，转换可以在扫描完成之前开始。
+    同一目录内的文件按 os.scandir 的顺序（取决于文件系统）产出，不排序，
+    避免超大目录在产出第一个文件前要等待整个目录扫描完；
+    子目录按名称顺序处理（每个目录扫描完才处理其子目录，排序不影响流式产出）。
+    
+    Args:
+        input_dir: 输入目录
+        recursive: 是否递归处理子目录
+        
+    Yields:
+        str: 图片文件路径
+    """
+    pending_dirs = [input_dir]
+    
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            entries = os.scandir(current_dir)
+        except OSError:
+            # 无权限或已被删除的目录直接跳过
+            continue
+        
+        subdirs = []
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                            yield entry.path
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                except OSError:
+                    continue
+        
+        # 倒序入栈，使子目录按名称顺序处理
+        subdirs.sort()
+        pending_dirs.extend(reversed(subdirs))
+
+def count_image_files(input_dir, recursive=False):
+    """
+    统计目录下的图片文件数量（不保存文件列表）
+    
+    Args:
+        input_dir: 输入目录
+        recursive: 是否递归处理子目录
+        
+    Returns:
+        int: 图片文件数量
+    """
+    return sum(1 for _ in iter_image_files(input_dir, recursive))
+
+def estimate_pixels(image_files, workers=DEFAULT_WORKERS):
+    """
+    读取文件头，估算每张图片的像素数（用于按工作量显示进度）
+    
+    读取文件头主要耗时在I/O上，使用线程并行读取。
+    
+    Args:
+        image_files: 图片文件路径的可迭代对象
+        workers: 并行线程数
+        
+    Returns:
+        dict: 图片路径 -> 像素数（无法识别的文件为0，转换时会记为失败）
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    def pixels(img_path):
+        try:
+            return probe_image(img_path)["pixels"]
+        except Exception:
+            return 0
+    
+    image_files = list(image_files)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(image_files, executor.map(pixels, image_files)))
+
+def pixel_bytes(mode):
+    """
+    Pillow 内部存储一个像素使用的字节数（RGB 等三通道模式按4字节对齐存储）
+    """
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+def estimate_memory(img_path, targets):
+    """
+    根据文件头估算转换一张图片的峰值内存
+    
+    包括解码后的图片（JPEG按 draft 实际解码的尺寸计算）以及每个输出目标
+    缩放、转换模式后的副本（多帧输出按帧数计算），不包括编码器的缓冲区。
+    
+    Args:
+        img_path: 输入图片路径，或已读入内存的图片数据（bytes）
+        targets: 输出目标列表
+        
+    Returns:
+        int: 估算的字节数；文件无法识别时为0（转换时会记为失败）
+    """
+    from PIL import Image
+    if isinstance(img_path, bytes):
+        img_path = io.BytesIO(img_path)
+    try:
+        with Image.open(img_path) as img:
+            width, height = img.size
+            sizes = [compute_target_size(img.size, target["max_size"], target["scale"]) for target in targets]
+            if img.format == "JPEG" and sizes and all(size != img.size for size in sizes):
+                # draft 最多缩小到1/8，且不小于各目标中最大的尺寸
+                need_width = max(size[0] for size in sizes)
+                need_height = max(size[1] for size in sizes)
+                factor = 1
+                while factor < 8 and width // (factor * 2) >= need_width and height // (factor * 2) >= need_height:
+                    factor *= 2
+                width, height = -(-width // factor), -(-height // factor)
+            decoded = width * height * pixel_bytes(img.mode)
+            # 输出为动画或多页时，处理后的每一帧都保留到编码完成
+            frames = getattr(img, "n_frames", 1)
+            copies = [frames if pillow_format(target["format"]) in ANIMATED_FORMATS else 1 for target in targets]
+    except Exception:
+        return 0
+    return decoded + sum(size[0] * size[1] * 4 * count for size, count in zip(sizes, copies))
+
+def probe_ahead(items, probe, workers=DEFAULT_WORKERS, depth=None):
+    """
+    在线程池中提前对后面的项调用 probe（如读取文件头），按原顺序产出 (项, 结果)
+    
+    与 estimate_pixels 一样，读取文件头主要耗时在I/O上，使用线程并行读取；
+    最多提前 depth 项，items 为目录扫描等生成器时不会一次读完。
+    
+    Args:
+        items: 可迭代对象
+        probe: 对每一项调用的函数，不应抛出异常
+        workers: 并行线程数
+        depth: 最多提前的项数，为None时为线程数的两倍
+        
+    Yields:
+        tuple: (项, probe 的结果)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    depth = depth or workers * 2
+    executor = ThreadPoolExecutor(max_workers=workers)
+    queued = deque()
+    try:
+        for item in items:
+            queued.append((item, executor.submit(probe, item)))
+            if len(queued) >= depth:
+                item, future = queued.popleft()
+                yield item, future.result()
+        while queued:
+            item, future = queued.popleft()
+            yield item, future.result()
+    finally:
+        # 提前结束（如取消转换）时不再读取排队中的文件头
+        # （不使用 shutdown 的 cancel_futures 参数，Python 3.9 才有）
+        for _, future in queued:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def get_image_files(input_dir, recursive=False):
+    """
+    获取目录下所有图片文件
+    
+    Args:
+        input_dir: 输入目录
+        recursive: 是否递归处理子目录
+        
+    Returns:
+        list: 图片文件路径列表
+    """
+    return list(iter_image_files(input_dir, recursive))
+
+def convert_images_multi(tasks, targets, workers=DEFAULT_WORKERS, metrics=None, cancel_event=None, memory_budget=None, cache=None,
+                         executor=None, report=None):
+    """
+    使用进程池并行批量转换图片，每张图片输出到多个目标
+    
+    同时提交的任务数限制为进程数的两倍，避免超大目录下任务堆积占用内存。
+    指定 memory_budget 时，提交前读取文件头估算每张图片的内存占用（见 estimate_memory，
+    在线程中提前读取，见 probe_ahead），已提交任务的估算总量超过预算时先等待其他图片完成；单张超出预算的图片单独转换。
+    结果按完成顺序逐个产出，而不是按输入顺序。
+    
+    Args:
+        tasks: 图片文件路径或 (输入路径, 输出路径列表) 元组的可迭代对象，
+            输出路径列表与 targets 对应，其中为None的目标不转换；
+            每张图片的目标不同时（如任务文件）为 (输入路径, 输出路径列表, 输出目标列表)
+        targets: 输出目标列表（见 make_target）
+        workers: 并行进程数，为1时在当前进程中逐个转换
+        metrics: ConversionMetrics 实例，传入时收集每张图片的各阶段耗时
+        cancel_event: threading.Event，被设置后不再提交新任务，并取消尚未开始的任务；
+            已经在转换的图片仍会完成并产出结果
+        memory_budget: 所有进程同时转换的图片估算内存总量上限（字节），为None时不限制
+        cache: ConversionCache 实例，内容相同的图片直接使用缓存的结果
+        executor: 已创建的 WorkerPool，多次调用时复用同一组进程（如监视模式）；
+            为None时创建新的进程池，用完后关闭。子进程异常退出时正在转换和排队中的图片记为失败，
+            进程池重建后继续转换其余图片
+        report: RunReport 实例，传入时记录每个目标的结果
+        
+    Yields:
+        list: 每张图片一个列表，包含每个目标的 (是否成功, 输入路径, 输出路径, 错误信息)
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+    def jobs():
+        for item in tasks:
+            if not isinstance(item, tuple):
+                yield item, targets, None
+                continue
+            img_path, output_paths, *item_targets = item
+            item_targets = item_targets[0] if item_targets else targets
+            selected = [index for index, path in enumerate(output_paths) if path is not None]
+            if selected:
+                yield img_path, [item_targets[i] for i in selected], [output_paths[i] for i in selected]
+    
+    with_stats = metrics is not None or report is not None
+    
+    def finish(results, stats):
+        if metrics is not None and stats is not None:
+            metrics.add(stats, all(result[0] for result in results))
+        if report is not None:
+            report.add(results, stats)
+        return results
+    
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+    
+    if workers <= 1 and executor is None:
+        for job in jobs():
+            if cancelled():
+                return
+            yield finish(*_convert_task(*job, with_stats, cache))
+        return
+    
+    max_pending = workers * 2
+    pool = contextlib.nullcontext(executor) if executor is not None else WorkerPool(workers)
+    with pool as executor:
+        pending = {}
+        costs = {}
+        
+        def must_wait(cost):
+            if len(pending) >= max_pending:
+                return True
+            return memory_budget is not None and sum(costs.values()) + cost > memory_budget
+        
+        def collect(futures):
+            for future in futures:
+                img_path, job_targets, output_paths = pending.pop(future)
+                costs.pop(future, None)
+                if future.cancelled():
+                    continue
+                try:
+                    results, stats = future.result()
+                except Exception as e:
+                    # 子进程异常退出等情况，记为失败而不是中断整个批次（之后提交时 WorkerPool 重建进程池）
+                    results = [(False, img_path, output_paths[i] if output_paths else None, describe_error(e))
+                               for i in range(len(job_targets))]
+                    if report is not None:
+                        report.add(results, error_type=type(e).__name__)
+                    yield results
+                    continue
+                yield finish(results, stats)
+        
+        if memory_budget is not None:
+            # 提前在线程中读取后面图片的文件头，主进程不必逐个等待
+            probed = probe_ahead(jobs(), lambda job: estimate_memory(job[0], job[1]), workers, max_pending)
+        else:
+            probed = ((job, 0) for job in jobs())
+        
+        for job, cost in probed:
+            while pending and must_wait(cost):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+            if cancelled():
+                break
+            future = executor.submit(_convert_task, *job, with_stats, cache)
+            pending[future] = job
+            costs[future] = cost
+        probed.close()
+        
+        while pending:
+            if cancelled():
+                for future in pending:
+                    future.cancel()
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+
+def convert_images(image_files, output_dir, target_format, quality=85, workers=DEFAULT_WORKERS, max_size=None, scale=None, profile=DEFAULT_PROFILE):
+    """
+    使用进程池并行批量转换图片
+    
+    Args:
+        image_files: 图片文件路径或 (输入路径, 输出路径) 元组的可迭代对象
+        output_dir: 输出目录路径
+        target_format: 目标格式（如jpg、png等）
+        quality: 输出图片质量（0-100）
+        workers: 并行进程数，为1时在当前进程中逐个转换
+        max_size: 最大尺寸 (宽, 高)，超过时等比缩小
+        scale: 缩放比例
+        profile: 编码配置（见 ENCODE_PROFILES）
+        
+    Yields:
+        tuple: (是否成功, 输入路径, 输出路径, 错误信息)
+    """
+    def tasks():
+        for item in image_files:
+            if isinstance(item, tuple):
+                img_path, output_path = item
+                yield (img_path, [output_path]) if output_path else img_path
+            else:
+                yield item
+    
+    targets = [make_target(target_format, quality, output_dir, max_size, scale, profile)]
+    for results in convert_images_multi(tasks(), targets, workers):
+        yield results[0]
+
+def validate_target(target):
+    """
+    检查输出目标（见 make_target）是否有效
+    
+    Raises:
+        ValueError: 参数无效时，异常信息可直接显示给用户
+    """
+    if target["format"] not in SUPPORTED_FORMATS:
+        raise ValueError(f"不支持的格式 '{target['format']}'，支持的格式：{'/'.join(SUPPORTED_FORMATS)}")
+    if target["quality"] < 0 or target["quality"] > 100:
+        raise ValueError(f"输出质量必须在0-100之间，当前值为 {target['quality']}")
+    if target["scale"] is not None and target["scale"] <= 0:
+        raise ValueError(f"缩放比例必须大于0，当前值为 {target['scale']}")
+    if target["profile"] not in ENCODE_PROFILES:
+        raise ValueError(f"无效的编码配置 '{target['profile']}'，可选：{'/'.join(ENCODE_PROFILES)}")
+    if target.get("max_bytes") is not None and target["max_bytes"] <= 0:
+        raise ValueError(f"输出大小上限必须大于0，当前值为 {target['max_bytes']}")
+
+class ConvertOptions:
+    """
+    批量转换参数
+    
+    包含一个或多个输出目标（见 make_target）以及批次级别的设置，
+    命令行、交互式模式和GUI都用它描述一次转换。指定 target_format 时，
+    由 quality、output_dir 等参数生成第一个输出目标，targets 中的目标排在其后。
+    """
+    
+    def __init__(self, target_format=None, quality=85, output_dir="output", max_size=None, scale=None,
+                 profile=DEFAULT_PROFILE, passthrough=None, targets=None, input_dir=None,
+                 keep_structure=False, on_conflict="suffix", workers=DEFAULT_WORKERS, memory_budget=None, cache=None,
+                 background=None, max_bytes=None, shrink_to_fit=False):
+        self.targets = []
+        if target_format:
+            self.targets.append(make_target(target_format, quality, output_dir, max_size, scale, profile, passthrough=passthrough,
+                                            background=background, max_bytes=max_bytes, shrink_to_fit=shrink_to_fit))
+        self.targets.extend(targets or [])
+        self.output_dir = output_dir
+        self.input_dir = input_dir
+        self.keep_structure = keep_structure
+        self.on_conflict = on_conflict
+        self.workers = workers
+        self.memory_budget = memory_budget
+        self.cache = cache
+    
+    def validate(self):
+        """
+        检查参数是否有效
+        
+        Raises:
+            ValueError: 参数无效时，异常信息可直接显示给用户
+        """
+        if not self.targets:
+            raise ValueError("请指定目标格式或输出目标")
+        for target in self.targets:
+            validate_target(target)
+        if self.on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突处理策略 '{self.on_conflict}'")
+        if self.keep_structure and not self.input_dir:
+            raise ValueError("保留目录结构时需要指定输入目录")
+        if self.workers < 1:
+            raise ValueError(f"并行进程数必须大于0，当前值为 {self.workers}")
+        if self.memory_budget is not None and self.memory_budget <= 0:
+            raise ValueError(f"内存预算必须大于0，当前值为 {self.memory_budget}")
+    
+    def manifest_params(self):
+        """
+        增量转换清单中记录的转换参数
+        
+        Returns:
+            list: 每个输出目标一项
+        """
+        return [
+            {
+                "format": target["format"],
+                "save": target_save_params(target),
+                "max_size": target["max_size"],
+                "scale": target["scale"],
+                "passthrough": target["passthrough"],
+                "background": target.get("background"),
+                "max_bytes": target.get("max_bytes"),
+                "shrink_to_fit": target.get("shrink_to_fit"),
+            }
+            for target in self.targets
+        ]
+
+def convert_batch(paths, options, metrics=None, cancel_event=None, should_convert=None, on_skip=None, executor=None, report=None):
+    """
+    批量转换引擎
+    
+    在当前进程中为每张图片的各输出目标规划输出路径（见 OutputPlanner），
+    再交给进程池并行转换（见 convert_images_multi）。paths 可以是
+    iter_image_files 返回的生成器，边扫描边转换。
+    
+    Args:
+        paths: 图片文件路径的可迭代对象
+        options: ConvertOptions 实例
+        metrics: ConversionMetrics 实例，传入时收集每张图片的各阶段耗时
+        cancel_event: threading.Event，被设置后停止提交并取消排队中的任务
+        should_convert: 可选回调 (输入路径, 输出路径列表) -> bool，
+            返回False时跳过该图片（如增量转换时未变化的图片）
+        on_skip: 可选回调 (输入路径)，图片被跳过时调用
+        executor: 复用的进程池（见 convert_images_multi）
+        report: RunReport 实例，传入时记录每个输出目标的结果（包括文件名冲突导致的失败）
+        
+    Yields:
+        list: 每张图片一个列表，包含每个输出目标的 (是否成功, 输入路径, 输出路径, 错误信息)
+    """
+    claimed = set()
+    planners = [
+        OutputPlanner(options.input_dir, target["output_dir"], target["format"], options.keep_structure, options.on_conflict, claimed)
+        for target in options.targets
+    ]
+    # 文件名冲突（error策略）导致的失败：部分目标失败的并入该图片的结果，全部失败的单独产出
+    conflict_failures = {}
+    failed_batches = deque()
+    
+    def tasks():
+        for img_path in paths:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            
+            output_paths = []
+            failures = []
+            for planner in planners:
+                try:
+                    output_paths.append(planner.plan(img_path))
+                except FileExistsError as e:
+                    failures.append((False, img_path, None, str(e)))
+                    output_paths.append(None)
+            if failures and report is not None:
+                report.add(failures, error_type="FileExistsError")
+            
+            if all(path is None for path in output_paths) or (should_convert and not should_convert(img_path, output_paths)):
+                if failures:
+                    failed_batches.append(failures)
+                elif on_skip:
+                    on_skip(img_path)
+                continue
+            
+            if failures:
+                conflict_failures[img_path] = failures
+            yield img_path, output_paths
+    
+    for results in convert_images_multi(tasks(), options.targets, options.workers, metrics, cancel_event,
+                                        options.memory_budget, options.cache, executor, report):
+        while failed_batches:
+            yield failed_batches.popleft()
+        yield results + conflict_failures.pop(results[0][1], [])
+    
+    while failed_batches:
+        yield failed_batches.popleft()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量图片格式转换器 - 任务文件
+按任务文件逐项转换，每项指定输入路径、输出路径和可选的转换参数。
+一个大任务可以用分片（i/N）确定地分配给多台机器，各分片把结果写入自己的结果文件，
+最后合并检查；各机器只需要访问同一个共享文件系统。
+
+任务文件为 JSON Lines（每行一个对象）或 CSV（第一行为列名），字段：
+    input（必需）、output、format、quality、max_size、scale、profile、passthrough、background、max_bytes、shrink_to_fit
+未指定的字段使用命令行参数；没有 format 时按 output 的扩展名确定格式，
+没有 output 时输出到输出目录下的同名文件。
+"""
+
+import os
+import csv
+import json
+import zlib
+
+from image_converter_core import (
+    DEFAULT_WORKERS, SUPPORTED_FORMATS, make_target, set_target_option, validate_target,
+    convert_images_multi,
+)
+
+def parse_shard(value):
+    """
+    解析分片参数，如 0/8 表示共8个分片中的第0个（序号从0开始）
+
+    Args:
+        value: 分片字符串
+
+    Returns:
+        tuple: (序号, 分片总数)
+    """
+    index, sep, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"无效的分片 '{value}'，应为 序号/总数，如 0/8")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"无效的分片 '{value}'，序号应在 0 到 总数-1 之间")
+    return index, count
+
+def shard_of(input_path, count):
+    """
+    任务所属的分片
+
+    按任务文件中写的输入路径的CRC32分配：与行号无关，任务文件增删或重排后
+    其余任务仍属于原来的分片；同一输入的多个任务总在同一分片。
+
+    Args:
+        input_path: 任务文件中的输入路径
+        count: 分片总数
+
+    Returns:
+        int: 分片序号
+    """
+    return zlib.crc32(input_path.encode("utf-8")) % count
+
+def read_job_records(path):
+    """
+    逐行读取任务文件（.csv 为CSV，其他为 JSON Lines），不会整个读入内存
+
+    Yields:
+        tuple: (行号, 字段字典)
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            # 跳过空行和注释
+            if not line or line.startswith("#"):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"任务文件第 {line_number} 行不是有效的JSON：{e}")
+            if not isinstance(record, dict):
+                raise ValueError(f"任务文件第 {line_number} 行应为JSON对象")
+            yield line_number, record
+
+def parse_job(record, defaults, where):
+    """
+    解析任务文件中的一项（转换服务的请求使用相同的字段）
+
+    Args:
+        record: 字段字典
+        defaults: 未指定的字段使用的默认值（make_target 的关键字参数）
+        where: 出错时在错误信息中指明的位置，如 "任务文件第 3 行"
+
+    Returns:
+        tuple: (输入路径, 输出路径, 输出目标)
+
+    Raises:
+        ValueError: 字段缺失或无效时
+    """
+    options = dict(defaults)
+    input_path = output_path = None
+    for key, value in record.items():
+        if key is None or value is None or value == "":
+            # CSV 中多出的列或空单元格
+            continue
+        key = key.strip().lower().replace("-", "_")
+        if key == "input":
+            input_path = str(value)
+        elif key == "output":
+            output_path = str(value)
+        else:
+            try:
+                set_target_option(options, key, value, where)
+            except (TypeError, ValueError) as e:
+                # 数值转换的错误信息中没有位置，补上
+                message = str(e)
+                raise ValueError(message if message.startswith(where) else f"{where}：{message}")
+
+    if not input_path:
+        raise ValueError(f"{where} 缺少 input")
+    if "target_format" not in options and output_path:
+        extension = os.path.splitext(output_path)[1][1:].lower()
+        if extension in SUPPORTED_FORMATS:
+            options["target_format"] = extension
+    if "target_format" not in options:
+        raise ValueError(f"{where} 缺少 format，且无法从 output 的扩展名确定")
+
+    target = make_target(**options)
+    try:
+        validate_target(target)
+    except ValueError as e:
+        raise ValueError(f"{where}：{e}")
+    if not output_path:
+        # 与 default_output_path 相同的文件名，输出目录在转换前才创建
+        filename = os.path.splitext(os.path.basename(input_path))[0]
+        output_path = os.path.join(target["output_dir"], f"{filename}.{target['format']}")
+    return input_path, output_path, target
+
+def iter_jobs(path, defaults, shard=None):
+    """
+    读取任务文件中属于指定分片的任务
+
+    Args:
+        path: 任务文件路径
+        defaults: 未指定的字段使用的默认值（make_target 的关键字参数）
+        shard: (序号, 分片总数)，为None时返回所有任务
+
+    Yields:
+        tuple: (输入路径, 输出路径, 输出目标)
+
+    Raises:
+        ValueError: 任务文件中有无效的行时
+    """
+    for line_number, record in read_job_records(path):
+        job = parse_job(record, defaults, f"任务文件第 {line_number} 行")
+        if shard is None or shard_of(job[0], shard[1]) == shard[0]:
+            yield job
+
+def results_path_for(jobs_path, shard=None):
+    """
+    默认的结果文件路径：与任务文件位于同一目录，各分片的文件名不同，
+    如 jobs.results.0-of-8.jsonl
+    """
+    base = os.path.splitext(jobs_path)[0]
+    if shard is None:
+        return f"{base}.results.jsonl"
+    return f"{base}.results.{shard[0]}-of-{shard[1]}.jsonl"
+
+class ShardResults:
+    """
+    分片结果文件
+
+    每个任务完成后追加一行JSON（输入、输出、是否成功，以及输出文件大小或错误信息），
+    并立即写入文件。分片被中断后以 resume=True 打开，跳过已经成功且输出文件大小
+    与记录一致的任务。与批次日志不同，结果文件在分片完成后保留，供 merge_results 合并。
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        Args:
+            path: 结果文件路径
+            resume: 为True时读取已有结果并继续追加，否则重新开始
+        """
+        self.path = path
+        self.completed = {}
+        self.skipped = 0
+        if resume:
+            for entry in load_results(path):
+                key = (entry["input"], entry["output"])
+                if entry.get("ok"):
+                    self.completed[key] = entry.get("size")
+                else:
+                    self.completed.pop(key, None)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def is_done(self, input_path, output_path):
+        """
+        判断任务在之前的运行中是否已经成功（输出文件仍然完整）
+        """
+        size = self.completed.get((input_path, output_path))
+        if size is None:
+            return False
+        try:
+            if os.path.getsize(output_path) != size:
+                return False
+        except OSError:
+            return False
+        self.skipped += 1
+        return True
+
+    def record(self, success, input_path, output_path, error):
+        """
+        记录一个任务的转换结果
+        """
+        entry = {"input": input_path, "output": output_path, "ok": success}
+        if success:
+            entry["size"] = os.path.getsize(output_path)
+        else:
+            entry["error"] = error
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def load_results(path):
+    """
+    读取结果文件（文件不存在时为空）
+
+    Yields:
+        dict: 每个任务的结果记录
+    """
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 被中断时写了一半的最后一行
+                continue
+            if isinstance(entry, dict) and "input" in entry and "output" in entry:
+                yield entry
+
+def merge_results(result_paths, merged_path=None):
+    """
+    合并各分片的结果文件
+
+    同一任务有多条记录时（继续中断的分片时追加的记录）以最后一条为准。
+
+    Args:
+        result_paths: 结果文件路径列表
+        merged_path: 合并后的结果文件路径，为None时不写入
+
+    Returns:
+        dict: (输入路径, 输出路径) -> 结果记录
+    """
+    merged = {}
+    for path in result_paths:
+        for entry in load_results(path):
+            key = (entry["input"], entry["output"])
+            # 重新插入，使合并结果按最后完成的顺序排列
+            merged.pop(key, None)
+            merged[key] = entry
+
+    if merged_path:
+        temp_path = merged_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in merged.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, merged_path)
+    return merged
+
+def convert_jobs(jobs, workers=DEFAULT_WORKERS, metrics=None, cancel_event=None, memory_budget=None, cache=None,
+                 should_convert=None, on_skip=None, report=None):
+    """
+    并行转换任务文件中的任务（见 convert_images_multi）
+
+    输出文件所在的目录在提交前创建。
+
+    Args:
+        jobs: (输入路径, 输出路径, 输出目标) 的可迭代对象（见 iter_jobs）
+        workers: 并行进程数
+        metrics: ConversionMetrics 实例
+        cancel_event: threading.Event，被设置后停止提交并取消排队中的任务
+        memory_budget: 同时转换的图片估算内存总量上限（字节）
+        cache: ConversionCache 实例
+        should_convert: 可选回调 (输入路径, 输出路径) -> bool，返回False时跳过该任务
+        on_skip: 可选回调 (输入路径, 输出路径)，任务被跳过时调用
+        report: RunReport 实例，传入时记录每个任务的结果
+
+    Yields:
+        tuple: 每个任务一个 (是否成功, 输入路径, 输出路径, 错误信息)
+    """
+    created = set()
+
+    def tasks():
+        for input_path, output_path, target in jobs:
+            directory = os.path.dirname(output_path)
+            if directory and directory not in created:
+                os.makedirs(directory, exist_ok=True)
+                created.add(directory)
+            if should_convert and not should_convert(input_path, output_path):
+                if on_skip:
+                    on_skip(input_path, output_path)
+                continue
+            yield input_path, [output_path], [target]
+
+    for results in convert_images_multi(tasks(), [], workers, metrics, cancel_event, memory_budget, cache, report=report):
+        yield results[0]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量图片格式转换器 - 目录监视
+监视输入目录中新增或修改的图片，文件写完并稳定一段时间后交给转换。
+安装了 watchdog 时使用系统的文件事件（Linux 上为 inotify），否则定时扫描目录。
+"""
+
+import os
+import time
+import threading
+
+from image_converter_core import IMAGE_EXTENSIONS, iter_image_files
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    # 未安装 watchdog 时退回定时扫描
+    Observer = None
+    FileSystemEventHandler = object
+
+def file_signature(path):
+    """
+    文件的大小和修改时间，用于判断文件是否仍在写入
+
+    Returns:
+        tuple: (大小, 修改时间纳秒)，文件不存在时返回None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+class _ChangeHandler(FileSystemEventHandler):
+    """
+    把文件事件中的路径交给 DirectoryWatcher
+    """
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        # 先写临时文件再重命名的程序，只有重命名后的路径是图片
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+class DirectoryWatcher:
+    """
+    目录监视器
+
+    新增或修改的图片先进入候选列表，大小和修改时间连续 settle 秒没有变化后
+    才认为已经写完，由 wait 返回，避免转换还在上传或复制中的文件。
+    已经返回过且之后没有变化的文件不会重复返回。
+    """
+
+    def __init__(self, input_dir, recursive=False, settle=2.0, interval=1.0, ignore_dirs=(), polling=False):
+        """
+        Args:
+            input_dir: 输入目录
+            recursive: 是否监视子目录
+            settle: 文件保持不变多少秒后认为已经写完
+            interval: 检查候选文件（以及定时扫描）的间隔秒数
+            ignore_dirs: 不监视的目录（如位于输入目录中的输出目录）
+            polling: 为True时即使安装了 watchdog 也使用定时扫描（如网络文件系统）
+        """
+        self.input_dir = input_dir
+        self.recursive = recursive
+        self.settle = settle
+        self.interval = interval
+        self.ignore_dirs = [os.path.join(os.path.abspath(path), "") for path in ignore_dirs]
+        self.polling = polling or Observer is None
+        self.backend = "定时扫描" if self.polling else "文件事件"
+        self.lock = threading.Lock()
+        self.changed = set()
+        self.candidates = {}
+        self.known = {}
+        self.observer = None
+
+    def is_ignored(self, path):
+        """
+        判断路径是否不需要处理（不是图片，或位于忽略的目录中）
+        """
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+            return True
+        path = os.path.abspath(path)
+        return any(path.startswith(directory) for directory in self.ignore_dirs)
+
+    def scan(self):
+        """
+        扫描输入目录中的图片（跳过忽略的目录）
+
+        Returns:
+            dict: 图片路径 -> 文件签名
+        """
+        snapshot = {}
+        for path in iter_image_files(self.input_dir, self.recursive):
+            if not self.is_ignored(path):
+                signature = file_signature(path)
+                if signature is not None:
+                    snapshot[path] = signature
+        return snapshot
+
+    def start(self):
+        """
+        开始监视：记录当前已有的文件，之后只报告新增或修改的文件
+        """
+        if self.polling:
+            self.known = self.scan()
+        else:
+            self.observer = Observer()
+            self.observer.schedule(_ChangeHandler(self), self.input_dir, recursive=self.recursive)
+            self.observer.start()
+
+    def stop(self):
+        """
+        停止监视
+        """
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def notify(self, path):
+        """
+        记录发生变化的文件（由文件事件线程调用）
+        """
+        if not self.is_ignored(path):
+            with self.lock:
+                self.changed.add(path)
+
+    def _collect_changes(self, now):
+        if self.polling:
+            snapshot = self.scan()
+            changed = [path for path, signature in snapshot.items() if self.known.get(path) != signature]
+            # 已删除的文件不再记录，重新出现时视为新文件
+            for path in set(self.known) - set(snapshot):
+                del self.known[path]
+        else:
+            with self.lock:
+                changed, self.changed = self.changed, set()
+
+        for path in changed:
+            signature = file_signature(path)
+            if signature is None or self.known.get(path) == signature:
+                continue
+            previous = self.candidates.get(path)
+            if previous is None or previous[0] != signature:
+                self.candidates[path] = (signature, now)
+
+    def poll(self):
+        """
+        返回已经写完的新增或修改的图片（不等待）
+
+        Returns:
+            list: 图片路径列表
+        """
+        now = time.monotonic()
+        self._collect_changes(now)
+
+        ready = []
+        for path, (signature, since) in list(self.candidates.items()):
+            current = file_signature(path)
+            if current is None:
+                # 文件在稳定前被删除或移走
+                del self.candidates[path]
+            elif current != signature:
+                self.candidates[path] = (current, now)
+            elif now - since >= self.settle:
+                del self.candidates[path]
+                self.known[path] = current
+                ready.append(path)
+        return ready
+
+    def wait(self, stop_event=None):
+        """
+        等待直到有已经写完的图片
+
+        Args:
+            stop_event: threading.Event，被设置时返回空列表
+
+        Returns:
+            list: 图片路径列表
+        """
+        while stop_event is None or not stop_event.is_set():
+            ready = self.poll()
+            if ready:
+                return ready
+            time.sleep(self.interval)
+        return []
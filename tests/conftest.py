@@ -0,0 +1,20 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# 转换器是仓库根目录下的独立模块，不是安装的包
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+TEST_INPUT = os.path.join(ROOT, "test_input")
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    """test_input 的副本，测试可以修改其中的文件"""
+    path = tmp_path / "input"
+    shutil.copytree(TEST_INPUT, str(path))
+    return str(path)
@@ -0,0 +1,124 @@
+"""
+压缩包输入输出：包内路径的安全检查、读取图片和写入结果（image_converter_core 的压缩包部分）
+"""
+
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+from conftest import ROOT, TEST_INPUT
+from image_converter_core import (
+    ArchiveWriter, archive_format_from_path, detect_archive, iter_archive_images, safe_member_path,
+)
+
+
+def image_bytes(name="test_0.png"):
+    with open(os.path.join(TEST_INPUT, name), "rb") as f:
+        return f.read()
+
+
+def tar_archive(members, compression=""):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=f"w:{compression}") as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("photo.png", "photo.png"),
+    ("album/photo.png", os.path.join("album", "photo.png")),
+    ("album/../photo.png", "photo.png"),
+    ("album\\photo.png", os.path.join("album", "photo.png")),
+    ("..photo.png", "..photo.png"),
+    ("../photo.png", None),
+    ("album/../../photo.png", None),
+    ("..\\photo.png", None),
+    ("/etc/photo.png", None),
+    ("..", None),
+])
+def test_safe_member_path(name, expected):
+    assert safe_member_path(name) == expected
+
+
+def test_archive_format_from_path():
+    assert archive_format_from_path("out.zip") == ("zip", "")
+    assert archive_format_from_path("OUT.TAR.GZ") == ("tar", "gz")
+    assert archive_format_from_path("out.tgz") == ("tar", "gz")
+    assert archive_format_from_path("out.tar.xz") == ("tar", "xz")
+    assert archive_format_from_path("out.gz") is None
+    assert archive_format_from_path("output") is None
+
+
+def test_detect_archive():
+    assert detect_archive(tar_archive([("a.png", image_bytes())])[:512]) == "tar"
+    assert detect_archive(tar_archive([("a.png", image_bytes())], "gz")[:512]) == "tar"
+    assert detect_archive(image_bytes()[:512]) is None
+
+
+def test_iter_archive_images_skips_other_files():
+    data = image_bytes()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("album/", b"")
+        archive.writestr("album/a.png", data)
+        archive.writestr("notes.txt", b"text")
+        archive.writestr("b.JPG", data)
+    buffer.seek(0)
+    assert detect_archive(buffer.getvalue()[:512]) == "zip"
+    assert list(iter_archive_images(buffer, "zip")) == [("album/a.png", data), ("b.JPG", data)]
+
+    tar = tar_archive([("album/a.png", data), ("notes.txt", b"text")], "gz")
+    assert list(iter_archive_images(io.BytesIO(tar), "tar")) == [("album/a.png", data)]
+
+
+def test_member_name_resolves_collisions_and_unsafe_paths():
+    writer = ArchiveWriter(io.BytesIO(), "zip")
+    assert writer.member_name("album/a.png", "WEBP") == "album/a.webp"
+    assert writer.member_name("album/a.jpg", "webp") == "album/a_1.webp"
+    assert writer.member_name("album/a.gif", "webp") == "album/a_2.webp"
+    assert writer.member_name("/abs/b.png", "webp") == "abs/b.webp"
+    # 输入压缩包中的 .. 不会带到输出压缩包
+    assert writer.member_name("../../c.png", "webp") == "c.webp"
+    assert writer.member_name("album/../../a.png", "webp") == "a.webp"
+    writer.close()
+
+
+@pytest.mark.parametrize("archive_format, compression", [("zip", ""), ("tar", ""), ("tar", "xz")])
+def test_archive_writer_round_trip(archive_format, compression):
+    buffer = io.BytesIO()
+    with ArchiveWriter(buffer, archive_format, compression) as writer:
+        writer.add(writer.member_name("album/a.png", "png"), b"first")
+        writer.add(writer.member_name("album/a.jpg", "png"), b"second")
+    buffer.seek(0)
+    if archive_format == "zip":
+        with zipfile.ZipFile(buffer) as archive:
+            # 图片已经压缩过，按存储方式写入
+            assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+            assert {name: archive.read(name) for name in archive.namelist()} == {
+                "album/a.png": b"first", "album/a_1.png": b"second"}
+    else:
+        with tarfile.open(fileobj=buffer) as archive:
+            assert {member.name: archive.extractfile(member).read() for member in archive} == {
+                "album/a.png": b"first", "album/a_1.png": b"second"}
+
+
+def test_cli_ignores_unsafe_members(tmp_path):
+    archive_path = tmp_path / "input.tar"
+    archive_path.write_bytes(tar_archive([("../escape.png", image_bytes()), ("album/ok.png", image_bytes())]))
+    output_dir = tmp_path / "nested" / "output"
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "image_converter.py"), "-i", str(archive_path), "-o", str(output_dir),
+         "-f", "webp", "--keep-structure"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=ROOT)
+    assert "不安全的路径" in result.stdout + result.stderr
+    assert os.path.isfile(str(output_dir / "album" / "ok.webp"))
+    assert not os.path.exists(str(tmp_path / "nested" / "escape.webp"))
+    assert sorted(os.listdir(str(tmp_path / "nested"))) == ["output"]
@@ -0,0 +1,79 @@
+"""
+转换结果缓存（ConversionCache）
+"""
+
+import os
+import shutil
+import time
+
+from image_converter_core import ConversionCache, convert_targets, file_digest, make_target
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_identical_content_hits_cache(input_dir, tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"))
+    copy = os.path.join(input_dir, "copy_of_test_1.png")
+    shutil.copy(os.path.join(input_dir, "test_1.png"), copy)
+    target = make_target("webp", output_dir=str(tmp_path / "output"))
+    os.makedirs(target["output_dir"])
+
+    first_stats, second_stats = {}, {}
+    first = convert_targets(os.path.join(input_dir, "test_1.png"), [target], stats=first_stats, cache=cache)
+    second = convert_targets(copy, [target], stats=second_stats, cache=cache)
+    assert first[0][0] and second[0][0]
+    assert (first_stats["cache_hits"], second_stats["cache_hits"]) == (0, 1)
+    assert read(first[0][2]) == read(second[0][2])
+
+
+def test_key_depends_on_parameters(input_dir):
+    digest = file_digest(os.path.join(input_dir, "test_1.png"))
+    keys = {
+        ConversionCache.key(digest, make_target("webp", 85)),
+        ConversionCache.key(digest, make_target("webp", 50)),
+        ConversionCache.key(digest, make_target("webp", 85, max_size=(50, 50))),
+        ConversionCache.key(digest, make_target("jpg", 85)),
+    }
+    assert len(keys) == 4
+    assert ConversionCache.key(digest, make_target("webp", 85)) in keys
+
+
+def test_passthrough_is_not_served_from_cache(input_dir, tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"))
+    img_path = os.path.join(input_dir, "test_1.png")
+    output_dir = str(tmp_path / "output")
+    os.makedirs(output_dir)
+
+    # 先以重新编码的方式填充缓存
+    convert_targets(img_path, [make_target("png", output_dir=output_dir)], cache=cache)
+    os.remove(os.path.join(output_dir, "test_1.png"))
+
+    stats = {}
+    results = convert_targets(img_path, [make_target("png", output_dir=output_dir, passthrough="copy")],
+                              stats=stats, cache=cache)
+    assert results[0][0]
+    assert (stats["passthrough"], stats["cache_hits"]) == (1, 0)
+    # 直接复制得到的是原文件，而不是缓存中重新编码的结果
+    assert read(results[0][2]) == read(img_path)
+
+
+def test_evict_removes_least_recently_used(input_dir, tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"))
+    output_dir = str(tmp_path / "output")
+    os.makedirs(output_dir)
+    targets = [make_target("webp", output_dir=output_dir), make_target("png", output_dir=output_dir)]
+    for name in ("test_0.png", "test_1.png"):
+        convert_targets(os.path.join(input_dir, name), targets, cache=cache)
+    entries = sorted(os.path.join(root, name) for root, _, names in os.walk(cache.cache_dir) for name in names)
+    assert len(entries) == 4
+
+    now = time.time()
+    for age, path in enumerate(entries):
+        os.utime(path, (now - 100 * age, now - 100 * age))
+    cache.max_bytes = sum(os.path.getsize(path) for path in entries[:2])
+    assert cache.evict() == 2
+    assert all(os.path.exists(path) for path in entries[:2])
+    assert not any(os.path.exists(path) for path in entries[2:])
@@ -0,0 +1,47 @@
+"""
+命令行入口：启动时的导入和单张图片的输出位置
+"""
+
+import os
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+from conftest import ROOT
+
+SCRIPT = os.path.join(ROOT, "image_converter.py")
+
+
+def run_cli(*args):
+    return subprocess.run([sys.executable, SCRIPT, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, cwd=ROOT)
+
+
+def test_import_does_not_load_pillow_or_archive_modules():
+    code = ("import sys, image_converter; "
+            "print(sorted(name for name in ('PIL', 'tarfile', 'zipfile', 'concurrent.futures') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, universal_newlines=True, cwd=ROOT)
+    assert result.stdout.strip() == "[]"
+
+
+def test_single_image_to_file(input_dir, tmp_path):
+    output_path = str(tmp_path / "photo.webp")
+    result = run_cli("-i", os.path.join(input_dir, "test_0.png"), "-o", output_path)
+    assert result.returncode == 0, result.stderr
+    assert os.path.getsize(output_path) > 0
+
+
+def test_single_image_to_archive(input_dir, tmp_path):
+    zip_path = str(tmp_path / "out.zip")
+    result = run_cli("-i", os.path.join(input_dir, "test_0.png"), "-o", zip_path, "-f", "webp")
+    assert result.returncode == 0, result.stderr
+    # 输出的是压缩包，而不是名为 out.zip 的目录
+    assert os.path.isfile(zip_path)
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.namelist() == ["test_0.webp"]
+
+    tar_path = str(tmp_path / "out.tar.gz")
+    assert run_cli("-i", os.path.join(input_dir, "test_0.jpg"), "-o", tar_path, "-f", "png").returncode == 0
+    with tarfile.open(tar_path) as archive:
+        assert archive.getnames() == ["test_0.png"]
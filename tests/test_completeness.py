@@ -0,0 +1,83 @@
+"""
+文件头信息与完整性检查（probe_image、check_complete）
+"""
+
+import io
+import os
+import struct
+
+import pytest
+from PIL import Image
+
+from conftest import TEST_INPUT
+from image_converter_core import check_complete, probe_image
+
+
+def encoded(format_name, **params):
+    buffer = io.BytesIO()
+    Image.effect_mandelbrot((64, 64), (-2, -1.5, 1, 1.5), 50).convert("RGB").save(buffer, format_name, **params)
+    return buffer.getvalue()
+
+
+def with_app1(jpeg, payload):
+    """在 SOI 之后插入一个 APP1 段（模拟带缩略图的 EXIF）"""
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload + jpeg[2:]
+
+
+def test_probe_image_reads_header():
+    info = probe_image(os.path.join(TEST_INPUT, "test_0.png"))
+    assert info == {"format": "PNG", "size": (100, 100), "mode": "RGB", "frames": 1, "pixels": 100 * 100}
+
+
+@pytest.mark.parametrize("name, format_name", [("test_0.jpg", "JPEG"), ("test_0.png", "PNG")])
+def test_complete_files_pass(name, format_name):
+    path = os.path.join(TEST_INPUT, name)
+    check_complete(path, format_name)
+    with open(path, "rb") as f:
+        check_complete(f.read(), format_name)
+
+
+@pytest.mark.parametrize("format_name", ["JPEG", "PNG"])
+def test_truncated_files_rejected(tmp_path, format_name):
+    data = encoded(format_name)
+    path = tmp_path / "truncated"
+    path.write_bytes(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        check_complete(str(path), format_name)
+    with pytest.raises(ValueError):
+        check_complete(memoryview(data[:-1]), format_name)
+
+
+def test_empty_file_rejected(tmp_path):
+    path = tmp_path / "empty.jpg"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError):
+        check_complete(str(path), "JPEG")
+
+
+def test_trailing_data_after_end_marker_accepted():
+    # 动态照片在 EOI 之后附加视频，远大于任何固定的尾部窗口
+    trailer = os.urandom(200 * 1024)
+    check_complete(encoded("JPEG") + trailer, "JPEG")
+    check_complete(encoded("PNG") + trailer, "PNG")
+
+
+def test_end_marker_inside_metadata_not_mistaken():
+    # EXIF 缩略图自带 EOI，压缩数据被截断时仍应判为不完整
+    thumbnail = encoded("JPEG", quality=10)
+    jpeg = with_app1(encoded("JPEG"), b"Exif\x00\x00" + thumbnail)
+    check_complete(jpeg, "JPEG")
+    with pytest.raises(ValueError):
+        check_complete(jpeg[:len(jpeg) - 100], "JPEG")
+
+
+def test_progressive_jpeg_checked():
+    data = encoded("JPEG", progressive=True)
+    check_complete(data, "JPEG")
+    with pytest.raises(ValueError):
+        check_complete(data[:-2], "JPEG")
+
+
+def test_other_formats_not_checked():
+    data = encoded("GIF")
+    check_complete(data[:len(data) // 2], "GIF")
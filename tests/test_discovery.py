@@ -0,0 +1,83 @@
+"""
+文件扫描与输出路径规划（iter_image_files、OutputPlanner）
+"""
+
+import os
+
+import pytest
+
+from image_converter_core import OutputPlanner, iter_image_files
+
+
+def test_iter_image_files_filters_by_extension(input_dir):
+    open(os.path.join(input_dir, "notes.txt"), "w").close()
+    open(os.path.join(input_dir, "UPPER.PNG"), "w").close()
+    top_level = {os.path.basename(path) for path in iter_image_files(input_dir)}
+    assert top_level == {"test_0.jpg", "test_0.png", "test_1.jpg", "test_1.png", "test_2.jpg", "test_2.png", "UPPER.PNG"}
+    nested = {os.path.relpath(path, input_dir) for path in iter_image_files(input_dir, recursive=True)}
+    assert nested == top_level | {os.path.join("subdir", "subtest_0.png"), os.path.join("subdir", "subtest_1.png")}
+
+
+def test_iter_image_files_visits_subdirectories_in_name_order(tmp_path):
+    # 创建顺序与名称顺序相反
+    for name in ("c", "b", "a"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "x.png").write_bytes(b"")
+    (tmp_path / "a" / "nested").mkdir()
+    (tmp_path / "a" / "nested" / "x.png").write_bytes(b"")
+
+    files = [os.path.relpath(path, str(tmp_path)) for path in iter_image_files(str(tmp_path), recursive=True)]
+    assert files == [os.path.join(*parts) for parts in (("a", "x.png"), ("a", "nested", "x.png"), ("b", "x.png"), ("c", "x.png"))]
+
+
+def test_planner_suffix_uses_source_extension(input_dir, tmp_path):
+    planner = OutputPlanner(input_dir, str(tmp_path / "output"), "webp")
+    first = planner.plan(os.path.join(input_dir, "test_0.jpg"))
+    second = planner.plan(os.path.join(input_dir, "test_0.png"))
+    third = planner.plan(os.path.join(input_dir, "subdir", "test_0.png"))
+    assert [os.path.basename(path) for path in (first, second, third)] == ["test_0.webp", "test_0_png.webp", "test_0_png_1.webp"]
+    assert os.path.isdir(str(tmp_path / "output"))
+
+
+def test_planner_suffix_does_not_depend_on_collision_count(input_dir, tmp_path):
+    names = ["test_0.gif", "test_0.jpg", "test_0.png"]
+    planned = []
+    for order in (names, names[::-1]):
+        planner = OutputPlanner(input_dir, str(tmp_path / "output"), "webp")
+        planned.append({name: os.path.basename(planner.plan(os.path.join(input_dir, name))) for name in order})
+    # 除了保留原名的第一个文件，带后缀的名称与出现顺序无关
+    assert planned[0]["test_0.jpg"] == planned[1]["test_0.jpg"] == "test_0_jpg.webp"
+    assert planned[0]["test_0.png"] == "test_0_png.webp"
+    assert planned[1]["test_0.gif"] == "test_0_gif.webp"
+
+
+def test_planner_skip_and_error_policies(input_dir, tmp_path):
+    skip = OutputPlanner(input_dir, str(tmp_path / "skip"), "webp", on_conflict="skip")
+    assert skip.plan(os.path.join(input_dir, "test_0.jpg")) is not None
+    assert skip.plan(os.path.join(input_dir, "test_0.png")) is None
+    assert skip.skipped == 1
+
+    error = OutputPlanner(input_dir, str(tmp_path / "error"), "webp", on_conflict="error")
+    error.plan(os.path.join(input_dir, "test_0.jpg"))
+    with pytest.raises(FileExistsError):
+        error.plan(os.path.join(input_dir, "test_0.png"))
+
+    with pytest.raises(ValueError):
+        OutputPlanner(input_dir, str(tmp_path / "bad"), "webp", on_conflict="overwrite")
+
+
+def test_planner_keep_structure(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    planner = OutputPlanner(input_dir, output_dir, "png", keep_structure=True)
+    assert planner.plan(os.path.join(input_dir, "subdir", "subtest_0.png")) == os.path.join(output_dir, "subdir", "subtest_0.png")
+    # 不同目录中的同名文件不冲突
+    assert planner.plan(os.path.join(input_dir, "test_0.jpg")) == os.path.join(output_dir, "test_0.png")
+
+
+def test_planner_shared_claims_across_targets(input_dir, tmp_path):
+    claimed = set()
+    output_dir = str(tmp_path / "output")
+    first = OutputPlanner(input_dir, output_dir, "png", claimed=claimed)
+    second = OutputPlanner(input_dir, output_dir, "png", claimed=claimed)
+    img_path = os.path.join(input_dir, "test_0.jpg")
+    assert first.plan(img_path) != second.plan(img_path)
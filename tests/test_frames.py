@@ -0,0 +1,80 @@
+"""
+动画和多页图片：保留所有帧、每帧时长和调色板模式（render_frames、gif_frame_strategy）
+"""
+
+import io
+import os
+
+import pytest
+from PIL import GifImagePlugin, Image, ImageSequence
+
+from image_converter_core import convert_buffer, convert_targets, gif_frame_strategy, make_target
+
+DURATIONS = [100, 200, 300]
+
+
+def animated_gif():
+    frames = [Image.new("P", (40, 30), index) for index in range(len(DURATIONS))]
+    for frame in frames:
+        frame.putpalette([channel for index in range(256) for channel in (index * 80 % 256, 0, 255 - index)])
+    buffer = io.BytesIO()
+    frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:], duration=DURATIONS, loop=0)
+    return buffer.getvalue()
+
+
+def frame_info(data):
+    frames = []
+    with Image.open(io.BytesIO(data)) as img:
+        for frame in ImageSequence.Iterator(img):
+            # WebP 在解码帧时才读取时长
+            frame.load()
+            frames.append((frame.size, frame.info.get("duration")))
+        return img.format, img.mode, frames
+
+
+@pytest.mark.parametrize("target_format, pillow_name", [("gif", "GIF"), ("webp", "WEBP")])
+def test_animation_frames_and_durations_kept(target_format, pillow_name):
+    data = convert_buffer(animated_gif(), make_target(target_format, max_size=(20, 20)))
+    format_name, _, frames = frame_info(data)
+    assert format_name == pillow_name
+    assert frames == [((20, 15), duration) for duration in DURATIONS]
+
+
+def test_gif_frames_stay_palette():
+    data = convert_buffer(animated_gif(), make_target("gif", max_size=(20, 20)))
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.mode == "P"
+        assert img.info.get("loop") == 0
+
+
+def test_single_frame_format_keeps_first_frame():
+    data = convert_buffer(animated_gif(), make_target("jpg"))
+    format_name, mode, frames = frame_info(data)
+    assert (format_name, mode, len(frames)) == ("JPEG", "RGB", 1)
+
+
+def test_convert_targets_writes_every_frame_for_each_target(tmp_path):
+    path = tmp_path / "anim.gif"
+    path.write_bytes(animated_gif())
+    targets = [make_target("gif", output_dir=str(tmp_path)), make_target("webp", output_dir=str(tmp_path))]
+    output_paths = [str(tmp_path / "out" / "anim.gif"), str(tmp_path / "out" / "anim.webp")]
+    os.makedirs(str(tmp_path / "out"))
+
+    results = convert_targets(str(path), targets, output_paths)
+    assert [result[0] for result in results] == [True, True]
+    for output_path in output_paths:
+        with open(output_path, "rb") as f:
+            assert [duration for _, duration in frame_info(f.read())[2]] == DURATIONS
+
+
+def test_gif_loading_strategy_restored():
+    saved = getattr(GifImagePlugin, "LOADING_STRATEGY", None)
+    convert_buffer(animated_gif(), make_target("webp"))
+    assert getattr(GifImagePlugin, "LOADING_STRATEGY", None) == saved
+
+    # 转换失败时同样恢复
+    with Image.open(io.BytesIO(animated_gif())) as img:
+        with pytest.raises(RuntimeError):
+            with gif_frame_strategy(img):
+                raise RuntimeError
+    assert getattr(GifImagePlugin, "LOADING_STRATEGY", None) == saved
@@ -0,0 +1,68 @@
+"""
+任务文件的分片与结果合并（image_converter_jobs）
+"""
+
+import json
+
+import pytest
+
+from image_converter_jobs import iter_jobs, merge_results, parse_shard, shard_of
+
+
+def test_parse_shard():
+    assert parse_shard("0/8") == (0, 8)
+    assert parse_shard("7/8") == (7, 8)
+    for value in ("8/8", "-1/8", "0/0", "a/b", "3"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def test_shard_assignment_is_pinned():
+    # 分配只取决于任务文件中写的输入路径（CRC32），各机器、各版本必须一致
+    expected = {
+        "test_0.jpg": (1, 6),
+        "test_0.png": (1, 7),
+        "test_2.jpg": (0, 6),
+        "subdir/subtest_0.png": (0, 5),
+        "subdir/subtest_1.png": (1, 5),
+        "照片/一.png": (2, 5),
+    }
+    assert {path: (shard_of(path, 3), shard_of(path, 8)) for path in expected} == expected
+    assert all(shard_of(path, 1) == 0 for path in expected)
+
+
+def test_shards_partition_jobs_independent_of_line_order(tmp_path):
+    names = [f"dir{index % 3}/image_{index}.png" for index in range(40)]
+    forward = tmp_path / "forward.jsonl"
+    backward = tmp_path / "backward.jsonl"
+    for path, order in ((forward, names), (backward, names[::-1])):
+        path.write_text("".join(json.dumps({"input": name, "output": name + ".webp", "format": "webp"}) + "\n"
+                                for name in order), encoding="utf-8")
+
+    count = 4
+    shards = [{job[0] for job in iter_jobs(str(forward), {}, (index, count))} for index in range(count)]
+    assert sorted(name for shard in shards for name in shard) == sorted(names)
+    assert sum(len(shard) for shard in shards) == len(names)
+    # 任务文件重排后每个任务仍属于原来的分片
+    assert shards == [{job[0] for job in iter_jobs(str(backward), {}, (index, count))} for index in range(count)]
+
+
+def test_merge_results_keeps_last_record(tmp_path):
+    first = tmp_path / "shard0.jsonl"
+    second = tmp_path / "shard1.jsonl"
+    first.write_text("\n".join(json.dumps(entry) for entry in [
+        {"input": "test_0.jpg", "output": "out/test_0.png", "ok": False},
+        {"input": "test_1.jpg", "output": "out/test_1.png", "ok": True},
+    ]) + "\n", encoding="utf-8")
+    second.write_text("\n".join(json.dumps(entry) for entry in [
+        {"input": "test_2.jpg", "output": "out/test_2.png", "ok": True},
+        {"input": "test_0.jpg", "output": "out/test_0.png", "ok": True},
+    ]) + '\n{"input": "test_', encoding="utf-8")
+
+    merged_path = str(tmp_path / "merged.jsonl")
+    merged = merge_results([str(first), str(second), str(tmp_path / "missing.jsonl")], merged_path)
+    assert len(merged) == 3
+    assert merged[("test_0.jpg", "out/test_0.png")]["ok"]
+    with open(merged_path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [entry["input"] for entry in lines] == ["test_1.jpg", "test_2.jpg", "test_0.jpg"]
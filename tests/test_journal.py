@@ -0,0 +1,106 @@
+"""
+中断后继续：原子写入输出文件与批次日志（write_atomic、Journal）
+"""
+
+import os
+
+import pytest
+
+from image_converter_core import Journal, temp_path_for, write_atomic
+
+
+def write_output(path, data=b"converted"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_temp_path_in_same_directory(tmp_path):
+    path = str(tmp_path / "out" / "photo.webp")
+    temp_path = temp_path_for(path)
+    # 同一目录才能用 os.replace 原子替换；以点开头，不会被当作输出图片
+    assert os.path.dirname(temp_path) == os.path.dirname(path)
+    assert os.path.basename(temp_path).startswith(".photo.webp.")
+
+
+def test_write_atomic_replaces_whole_file(tmp_path):
+    path = str(tmp_path / "photo.webp")
+    write_atomic(path, b"old")
+    write_atomic(path, b"new contents")
+    with open(path, "rb") as f:
+        assert f.read() == b"new contents"
+    assert os.listdir(str(tmp_path)) == ["photo.webp"]
+
+
+def test_write_atomic_keeps_old_file_on_failure(tmp_path, monkeypatch):
+    path = str(tmp_path / "photo.webp")
+    write_atomic(path, b"old")
+
+    def interrupted(source, target):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(os, "replace", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        write_atomic(path, b"new")
+    monkeypatch.undo()
+    with open(path, "rb") as f:
+        assert f.read() == b"old"
+    # 临时文件已删除
+    assert os.listdir(str(tmp_path)) == ["photo.webp"]
+
+
+def test_journal_resume_skips_completed_images(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    done = os.path.join(input_dir, "test_0.png")
+    failed = os.path.join(input_dir, "test_1.png")
+    params = {"format": "webp", "quality": 85}
+
+    journal = Journal(output_dir, params)
+    journal.record([(True, done, write_output(os.path.join(output_dir, "test_0.webp")), None)])
+    journal.record([(False, failed, None, "损坏的图片")])
+    journal.close()
+
+    resumed = Journal(output_dir, params, resume=True)
+    assert resumed.resumed
+    assert resumed.is_done(done)
+    assert not resumed.is_done(failed)
+    assert not resumed.is_done(os.path.join(input_dir, "test_2.png"))
+    assert resumed.skipped == 1
+    resumed.close(finished=True)
+    assert not os.path.exists(resumed.path)
+
+
+def test_journal_resume_reconverts_changed_output(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    img_path = os.path.join(input_dir, "test_0.png")
+    output_path = write_output(os.path.join(output_dir, "test_0.webp"))
+
+    journal = Journal(output_dir, {"format": "webp"})
+    journal.record([(True, img_path, output_path, None)])
+    journal.close()
+    # 输出文件被截断：大小与日志记录不一致
+    write_output(output_path, b"x")
+
+    assert not Journal(output_dir, {"format": "webp"}, resume=True).is_done(img_path)
+
+
+def test_journal_resume_ignores_partial_last_line(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    img_path = os.path.join(input_dir, "test_0.png")
+
+    journal = Journal(output_dir, {"format": "webp"})
+    journal.record([(True, img_path, write_output(os.path.join(output_dir, "test_0.webp")), None)])
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"input": "')
+
+    assert Journal(output_dir, {"format": "webp"}, resume=True).is_done(img_path)
+
+
+def test_journal_resume_rejects_different_params(tmp_path):
+    output_dir = str(tmp_path / "output")
+    Journal(output_dir, {"format": "webp"}).close()
+    with pytest.raises(ValueError):
+        Journal(output_dir, {"format": "png"}, resume=True)
+
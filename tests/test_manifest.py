@@ -0,0 +1,85 @@
+"""
+增量转换清单（Manifest）
+"""
+
+import os
+
+from image_converter_core import Manifest
+
+
+def write_output(path, data=b"converted"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_manifest_skips_unchanged_images(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    img_path = os.path.join(input_dir, "test_0.jpg")
+    output_path = write_output(os.path.join(output_dir, "test_0.png"))
+    params = {"format": "png"}
+
+    manifest = Manifest(output_dir)
+    assert manifest.needs_conversion(img_path, params, [output_path])
+    manifest.record(img_path, [output_path])
+    manifest.save()
+
+    manifest = Manifest(output_dir)
+    assert not manifest.needs_conversion(img_path, params, [output_path])
+    assert manifest.skipped == 1
+    # 参数变化、输出路径变化、输出被删除时都重新转换
+    assert manifest.needs_conversion(img_path, {"format": "png", "quality": 50}, [output_path])
+    assert manifest.needs_conversion(img_path, params, [os.path.join(output_dir, "other.png")])
+    os.remove(output_path)
+    assert manifest.needs_conversion(img_path, params, [output_path])
+
+
+def test_manifest_hash_confirms_touched_images(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    img_path = os.path.join(input_dir, "test_0.jpg")
+    output_path = write_output(os.path.join(output_dir, "test_0.png"))
+    params = {"format": "png"}
+
+    for use_hash in (False, True):
+        manifest = Manifest(output_dir, use_hash=use_hash)
+        manifest.needs_conversion(img_path, params, [output_path])
+        manifest.record(img_path, [output_path])
+        manifest.save()
+
+        stat = os.stat(img_path)
+        os.utime(img_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        # 只有修改时间变化：不计算摘要时重新转换，计算摘要时确认内容未变后跳过
+        assert Manifest(output_dir, use_hash=use_hash).needs_conversion(img_path, params, [output_path]) != use_hash
+
+
+def test_manifest_ignores_corrupt_file(tmp_path):
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    manifest = Manifest(str(output_dir))
+    with open(manifest.path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert Manifest(str(output_dir)).entries == {}
+
+
+def test_manifest_treats_vanished_input_as_needing_conversion(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    img_path = os.path.join(input_dir, "test_0.jpg")
+    os.remove(img_path)
+
+    for use_hash in (False, True):
+        manifest = Manifest(output_dir, use_hash=use_hash)
+        # 扫描之后被删除的文件交给转换任务记为失败，而不是抛出异常中断批次
+        assert manifest.needs_conversion(img_path, {"format": "png"})
+        manifest.record(img_path, [os.path.join(output_dir, "test_0.png")])
+        assert manifest.entries == {}
+
+
+def test_manifest_hash_handles_input_deleted_after_conversion(input_dir, tmp_path):
+    output_dir = str(tmp_path / "output")
+    img_path = os.path.join(input_dir, "test_0.jpg")
+    manifest = Manifest(output_dir, use_hash=True)
+    assert manifest.needs_conversion(img_path, {"format": "png"})
+    os.remove(img_path)
+    manifest.record(img_path, [write_output(os.path.join(output_dir, "test_0.png"))])
+    assert manifest.entries == {}
@@ -0,0 +1,51 @@
+"""
+输出大小上限（max_bytes）：按质量二分查找，允许时缩小尺寸
+"""
+
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import TEST_INPUT
+from image_converter_core import encode_image, make_target
+
+
+def detailed_image():
+    """细节丰富的图片，JPEG 大小随质量明显变化（test_input 中的图片是纯色的）"""
+    return Image.effect_mandelbrot((256, 256), (-2, -1.5, 1, 1.5), 100).convert("RGB")
+
+
+def test_max_bytes_met_without_search():
+    with Image.open(os.path.join(TEST_INPUT, "test_0.jpg")) as img:
+        img.load()
+        plain = encode_image(img, make_target("jpg", 85))
+        limited = encode_image(img, make_target("jpg", 85, max_bytes=len(plain)))
+    assert limited == plain
+
+
+def test_max_bytes_lowers_quality():
+    img = detailed_image()
+    full = encode_image(img, make_target("jpg", 95))
+    limit = len(full) // 2
+    data = encode_image(img, make_target("jpg", 95, max_bytes=limit))
+    assert len(data) <= limit
+    assert Image.open(io.BytesIO(data)).size == img.size
+    # 二分查找得到的是满足上限的最高质量，不会比上限小很多
+    assert len(data) > limit // 2
+
+
+def test_max_bytes_unreachable_without_shrinking():
+    img = detailed_image()
+    with pytest.raises(ValueError):
+        encode_image(img, make_target("jpg", 95, max_bytes=500))
+
+
+def test_max_bytes_shrinks_when_allowed():
+    img = detailed_image()
+    data = encode_image(img, make_target("jpg", 95, max_bytes=1000, shrink_to_fit=True))
+    assert len(data) <= 1000
+    width, height = Image.open(io.BytesIO(data)).size
+    assert width < img.width and height < img.height
+
@@ -0,0 +1,71 @@
+"""
+内存预算调度：提前读取文件头（probe_ahead）与按预算提交任务
+"""
+
+import os
+import threading
+import time
+
+from image_converter_core import convert_images_multi, convert_members, estimate_memory, make_target, probe_ahead
+
+
+def test_probe_ahead_keeps_order_and_bounded_lookahead():
+    consumed = []
+
+    def items():
+        for index in range(20):
+            consumed.append(index)
+            yield index
+
+    probed = probe_ahead(items(), lambda item: item * item, workers=2, depth=4)
+    assert next(probed) == (0, 0)
+    # 只提前读取 depth 项，不会一次读完输入
+    assert len(consumed) == 4
+    assert list(probed) == [(index, index * index) for index in range(1, 20)]
+
+
+def test_probe_ahead_close_stops_reading():
+    started = []
+    release = threading.Event()
+
+    def probe(item):
+        started.append(item)
+        if item:
+            release.wait(5)
+        return item
+
+    probed = probe_ahead(range(100), probe, workers=1, depth=10)
+    assert next(probed) == (0, 0)
+    probed.close()
+    release.set()
+    time.sleep(0.1)
+    # 最多完成正在读取的一项，排队中的文件头不再读取
+    assert started in ([0], [0, 1])
+
+
+def test_estimate_memory_counts_targets(input_dir):
+    img_path = os.path.join(input_dir, "test_0.png")
+    single = estimate_memory(img_path, [make_target("webp")])
+    assert single > 100 * 100
+    assert estimate_memory(img_path, [make_target("webp"), make_target("png")]) > single
+    with open(img_path, "rb") as f:
+        assert estimate_memory(f.read(), [make_target("webp")]) == single
+    assert estimate_memory(os.path.join(input_dir, "missing.png"), [make_target("webp")]) == 0
+
+
+def test_budgeted_batches_convert_every_image(input_dir, tmp_path):
+    files = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.endswith(".png"))
+    target = make_target("webp")
+    # 预算小于单张图片：逐张转换，但每张都完成
+    budget = estimate_memory(files[0], [target]) // 2
+
+    members = [(os.path.basename(path), path) for path in files]
+    results = list(convert_members(members, target, workers=2, memory_budget=budget))
+    assert sorted(result[0] for result in results if result[1]) == sorted(name for name, _ in members)
+
+    output_dir = str(tmp_path / "output")
+    os.makedirs(output_dir)
+    tasks = [(path, [os.path.join(output_dir, os.path.basename(path) + ".webp")]) for path in files]
+    results = [result for results in convert_images_multi(tasks, [target], workers=2, memory_budget=budget)
+               for result in results]
+    assert len(results) == len(files) and all(result[0] for result in results)
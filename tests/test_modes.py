@@ -0,0 +1,63 @@
+"""
+按目标格式转换颜色模式（prepare_mode、parse_background）
+"""
+
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import TEST_INPUT
+from image_converter_core import parse_background, prepare_mode
+
+
+def test_supported_mode_returned_unchanged():
+    img = Image.new("RGB", (4, 4), "red")
+    assert prepare_mode(img, "png") is img
+    assert prepare_mode(img, "jpg") is img
+
+
+def test_alpha_flattened_onto_background_for_jpeg():
+    img = Image.new("RGBA", (4, 4), (0, 0, 0, 0))
+    img.putpixel((1, 1), (255, 0, 0, 255))
+    white = prepare_mode(img, "jpg")
+    assert white.mode == "RGB"
+    assert white.getpixel((0, 0)) == (255, 255, 255)
+    assert white.getpixel((1, 1)) == (255, 0, 0)
+    assert prepare_mode(img, "jpg", parse_background("black")).getpixel((0, 0)) == (0, 0, 0)
+
+
+def test_alpha_kept_when_target_supports_it():
+    img = Image.new("LA", (4, 4), (128, 0))
+    assert prepare_mode(img, "png") is img
+    assert prepare_mode(img, "webp").mode == "RGBA"
+    # 灰度图片合成背景后保持灰度
+    assert prepare_mode(img, "jpg").mode == "L"
+
+
+def test_16_bit_gray_scaled_not_clipped():
+    img = Image.new("I;16", (4, 4), 32768)
+    converted = prepare_mode(img, "jpg")
+    assert converted.mode == "L"
+    assert converted.getpixel((0, 0)) == 128
+
+
+def test_cmyk_converted_to_rgb():
+    assert prepare_mode(Image.new("CMYK", (4, 4)), "png").mode == "RGB"
+
+
+def test_colour_key_transparency_kept_for_webp():
+    with Image.open(os.path.join(TEST_INPUT, "test_0.png")) as img:
+        img.load()
+        img.info["transparency"] = img.getpixel((0, 0))
+        assert prepare_mode(img, "png") is img
+        assert prepare_mode(img, "webp").mode == "RGBA"
+        assert prepare_mode(img, "webp").getpixel((0, 0))[3] == 0
+        assert prepare_mode(img, "jpg").mode == "RGB"
+
+
+def test_parse_background():
+    assert parse_background("white") == "#ffffff"
+    assert parse_background(" rgb(1, 2, 3) ") == "#010203"
+    with pytest.raises(ValueError):
+        parse_background("not-a-colour")
@@ -0,0 +1,56 @@
+"""
+进程池：子进程异常退出后继续转换（WorkerPool、convert_images_multi）
+"""
+
+import multiprocessing
+import os
+import shutil
+
+import pytest
+
+import image_converter_core
+from image_converter_core import WorkerPool, convert_images_multi, make_target
+
+# 任务函数按名称传给子进程，替换后的函数只有在 fork 出的子进程中才能找到
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="需要 fork 启动子进程")
+
+ORIGINAL_TASK = image_converter_core._convert_task
+
+
+def crash_on_marked_file(img_path, *args):
+    """模拟被 OOM killer 杀死的转换进程"""
+    if os.path.basename(img_path).startswith("crash"):
+        os._exit(1)
+    return ORIGINAL_TASK(img_path, *args)
+
+
+def test_worker_pool_restarts_after_crash():
+    with WorkerPool(1) as pool:
+        assert pool.submit(abs, -1).result() == 1
+        with pytest.raises(Exception) as error:
+            pool.submit(os._exit, 1).result()
+        assert "进程异常退出" in image_converter_core.describe_error(error.value)
+        assert pool.submit(abs, -2).result() == 2
+        assert pool.restarts == 1
+
+
+def test_batch_survives_worker_crash(input_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_converter_core, "_convert_task", crash_on_marked_file)
+    crash = os.path.join(input_dir, "crash.png")
+    shutil.copy(os.path.join(input_dir, "test_0.png"), crash)
+    others = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.startswith("test_"))
+    output_dir = str(tmp_path / "output")
+    os.makedirs(output_dir)
+    tasks = [(path, [os.path.join(output_dir, os.path.basename(path) + ".webp")]) for path in [crash] + others]
+
+    with WorkerPool(1) as pool:
+        results = [result for results in convert_images_multi(tasks, [make_target("webp")], workers=1, executor=pool)
+                   for result in results]
+        assert pool.restarts == 1
+
+    assert len(results) == len(tasks)
+    by_input = {result[1]: result for result in results}
+    assert not by_input[crash][0]
+    assert "进程异常退出" in by_input[crash][3]
+    # 与崩溃的图片同时排队的图片可能一起失败，其余图片在重建的进程池中完成
+    assert sum(result[0] for result in results) >= len(others) - 1